@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+import time
+import shutil
+import sqlite3
+import threading
+from config import Settings
+
+
+def _connect(cache_dir):
+    """
+    Open cache.db for RasterCache / MetadataCache. Both classes (one connection each, used from
+    the HUC threads) write to the same file, so use WAL mode (readers never block the writer) and
+    wait up to 30 s for the other connection's write lock instead of failing with 'database is locked'.
+    """
+    db = sqlite3.connect(os.path.join(cache_dir, 'cache.db'), timeout=30, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    return db
+
+
+class RasterCache:
+    """
+    On-disk cache of downloaded HUC rasters keyed by (HUC, modality, start date, end date, export config).
+
+    The export config is a dict of everything else that shapes the exported pixels (CRS, scale,
+    dtype, buffer, source collections and filters); it enters the key as a short hash, so changing
+    any of it misses the cache instead of restoring a raster built with the old settings.
+    Files are kept in CACHE_DIR as '<huc>_<modality>_<start>_<end>_<config hash>.tif' and tracked in a
+    small SQLite manifest (cache.db) together with their size and mtime, so a rerun can
+    reuse a raster instead of exporting it from GEE again.
+    """
+
+    def __init__(self, settings:Settings):
+        self.settings = settings
+        self.cache_dir = settings.CACHE_DIR
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = _connect(self.cache_dir)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(rasters)")]
+        if columns and 'config' not in columns:
+            # manifest from before the export config was part of the key: its rasters cannot be
+            # matched to the settings they were exported with, so drop them
+            for (path,) in self._db.execute("SELECT path FROM rasters"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._db.execute("DROP TABLE rasters")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rasters ("
+            " huc TEXT, modality TEXT, start_date TEXT, end_date TEXT, config TEXT,"
+            " path TEXT, size INTEGER, mtime REAL, last_access REAL,"
+            " PRIMARY KEY (huc, modality, start_date, end_date, config))"
+        )
+        self._db.commit()
+
+    def _key(self, huc_id, modality, config):
+        config_hash = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+        return (str(huc_id), modality, self.settings.START_DATE, self.settings.END_DATE, config_hash)
+
+    def lookup(self, huc_id, modality, config):
+        """Return the cached raster path for the key, or None if missing or stale."""
+        key = self._key(huc_id, modality, config)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path, size, mtime FROM rasters"
+                " WHERE huc=? AND modality=? AND start_date=? AND end_date=? AND config=?",
+                key
+            ).fetchone()
+            if row is None:
+                return None
+
+            path, size, mtime = row
+            if not os.path.exists(path) or os.path.getsize(path) != size or os.path.getmtime(path) != mtime:
+                # file was removed or rewritten outside the cache
+                self._db.execute(
+                    "DELETE FROM rasters WHERE huc=? AND modality=? AND start_date=? AND end_date=? AND config=?", key
+                )
+                self._db.commit()
+                return None
+
+            self._db.execute(
+                "UPDATE rasters SET last_access=?"
+                " WHERE huc=? AND modality=? AND start_date=? AND end_date=? AND config=?",
+                (time.time(), *key)
+            )
+            self._db.commit()
+            return path
+
+    def register(self, huc_id, modality, config, source_path):
+        """
+        Add a downloaded raster to the cache (hard link when possible, copy otherwise).
+        Downloads replace their target file instead of rewriting it, so the link never aliases a later download.
+        """
+        huc, modality, start, end, config_hash = self._key(huc_id, modality, config)
+        cache_path = os.path.join(self.cache_dir, f"{huc}_{modality}_{start}_{end}_{config_hash}.tif")
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        try:
+            os.link(source_path, cache_path)
+        except OSError:
+            shutil.copy2(source_path, cache_path)
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO rasters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (huc, modality, start, end, config_hash, cache_path,
+                 os.path.getsize(cache_path), os.path.getmtime(cache_path), time.time())
+            )
+            self._db.commit()
+        self.evict()
+        return cache_path
+
+    def restore(self, huc_id, modality, config, destination_path):
+        """
+        Copy a cached raster to destination_path. Returns False on a cache miss.
+        A copy (not a hard link) keeps anything later writing to destination_path away from the cache entry.
+        """
+        cache_path = self.lookup(huc_id, modality, config)
+        if cache_path is None:
+            return False
+        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+        partial_path = f'{destination_path}.part'
+        shutil.copy2(cache_path, partial_path)
+        os.replace(partial_path, destination_path)
+        return True
+
+    def evict(self):
+        """Drop least recently used rasters until the cache fits in CACHE_MAX_BYTES."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT huc, modality, start_date, end_date, config, path, size FROM rasters ORDER BY last_access ASC"
+            ).fetchall()
+            total = sum(row[6] for row in rows)
+            for huc, modality, start, end, config_hash, path, size in rows:
+                if total <= self.settings.CACHE_MAX_BYTES:
+                    break
+                if os.path.exists(path):
+                    os.remove(path)
+                self._db.execute(
+                    "DELETE FROM rasters WHERE huc=? AND modality=? AND start_date=? AND end_date=? AND config=?",
+                    (huc, modality, start, end, config_hash)
+                )
+                total -= size
+                print(f"Evicted cached raster: {path}")
+            self._db.commit()
+
+
+class MetadataCache:
+    """
+    Small JSON key/value store for GEE metadata (e.g. the selected HUC list), kept in the
+    same cache.db as RasterCache so reruns can skip the getInfo() round-trip.
+    """
+
+    def __init__(self, settings:Settings):
+        self.settings = settings
+        os.makedirs(settings.CACHE_DIR, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = _connect(settings.CACHE_DIR)
+        self._db.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT, created REAL)")
+        self._db.commit()
+
+    def get_or_fetch(self, key, fetch, ttl=None, cacheable=None):
+        """
+        Return the cached value for key (a tuple), calling fetch() and storing its result when missing or older than ttl.
+        A fetched value for which cacheable(value) is False is returned without being stored.
+        """
+        ttl = self.settings.METADATA_CACHE_TTL if ttl is None else ttl
+        key = json.dumps(key)
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM metadata WHERE key=?", (key,)).fetchone()
+        if row is not None and time.time() - row[1] < ttl:
+            return json.loads(row[0])
+
+        value = fetch()
+        if cacheable is not None and not cacheable(value):
+            return value
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?)", (key, json.dumps(value), time.time()))
+            self._db.commit()
+        return value
@@ -1,30 +1,60 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
 class Settings:
-    def __init__(self):
-        
-        self.NUMBER_OF_HUCS = 1  # randomly selected HUCs number # This is for testing purposes
-        self.BUFFER_DISTANCE_METERS = 5000  # buffer distance in meters
-        self.START_DATE = '2023-01-01'
-        self.END_DATE = '2024-12-31'
-        self.DRIVE_FOLDER = 'GEE_HUC_Exports_Python_Full'  # Google Drive folder name for exports
-        self.LOCAL_DOWNLOAD_DIR = 'gee_downloads' # download directory for GEE exports
-        self.EXPORT_VECTOR_FORMAT = 'GeoJSON'  # export vector format, can be 'GeoJSON' or 'KML'
-        self.TARGET_DEM_CRS = 'EPSG:4269'  # target CRS for DEM exports
-        self.GDRIVE_CREDENTIALS_FILE = 'credentials.json' # Google Drive API credentials file
-        self.GEE_PROJECT_ID = 'nathanj-national-ml'  # GEE project ID for exports
-
-        # data 
-        self.HUC8_COL_NAME = 'USGS/WBD/2017/HUC08' #ee.FeatureCollection('USGS/WBD/2017/HUC08')
-        self.MERIT_HYDRO_IMG_NAME = 'MERIT/Hydro/v1_0_1' #ee.Image('MERIT/Hydro/v1_0_1')
-        self.DEM_SOURCE_IMG_NAME ='USGS/3DEP/10m'
-        
-        # patches
-        self.PATCH = True
-        self.PATCH_SIZE = 224
-        self.PATCH_STRIDE =224
-        self.BATCH_EXPORT_SIZE = 500
-        
-        self.VISUALIZE_POINTS = True  # whether to visualize points on the map
-        
-
-        # Google Drive API
-        self.SCOPES = ['https://www.googleapis.com/auth/drive']
\ No newline at end of file
+
+    NUMBER_OF_HUCS: int = 1  # randomly selected HUCs number # This is for testing purposes
+    RANDOM_SEED: int = 0  # seed of the random HUC selection
+    BUFFER_DISTANCE_METERS: int = 5000  # buffer distance in meters
+    START_DATE: str = '2023-01-01'
+    END_DATE: str = '2024-12-31'
+    MAX_CLOUD_COVER: float = 30  # Landsat scenes above this CLOUD_COVER (%) are not composited; 100 keeps all
+    DRIVE_FOLDER: str = 'GEE_HUC_Exports_Python_Full'  # Google Drive folder name for exports
+    MERGE_DRIVE_FOLDERS: bool = True  # merge/move HUC folders into DRIVE_FOLDER on Drive; False downloads them directly
+    DELETE_DRIVE_AFTER_DOWNLOAD: bool = True  # without merging: delete each HUC's Drive folders once all their files are downloaded
+    LOCAL_DOWNLOAD_DIR: str = 'gee_downloads' # download directory for GEE exports
+    EXPORT_VECTOR_FORMAT: str = 'GeoJSON'  # export vector format, can be 'GeoJSON' or 'KML'
+    TARGET_DEM_CRS: str = 'EPSG:4269'  # target CRS for DEM exports
+    GDRIVE_CREDENTIALS_FILE: str = 'credentials.json' # Google Drive API credentials file
+    GEE_PROJECT_ID: str = 'nathanj-national-ml'  # GEE project ID for exports
+    GEE_PARALLELISM: int = 25  # HUCs whose export tasks are built concurrently (high-volume endpoint)
+    CACHE_DIR: str = 'gee_cache'  # on-disk cache of downloaded rasters, keyed by (HUC, modality, dates, export config)
+    CACHE_MAX_BYTES: int = 50 * 1024**3  # LRU eviction threshold for CACHE_DIR
+    METADATA_CACHE_TTL: int = 7 * 24 * 3600  # seconds cached GEE metadata (selected HUC list) is reused
+
+    # data
+    HUC8_COL_NAME: str = 'USGS/WBD/2017/HUC08' #ee.FeatureCollection('USGS/WBD/2017/HUC08')
+    MERIT_HYDRO_IMG_NAME: str = 'MERIT/Hydro/v1_0_1' #ee.Image('MERIT/Hydro/v1_0_1')
+    DEM_SOURCE_IMG_NAME: str = 'USGS/3DEP/10m'
+
+    # patches
+    PATCH: bool = True
+    PATCH_SIZE: int = 224
+    PATCH_STRIDE: int = 224
+    BATCH_EXPORT_SIZE: int = 500
+    PATCH_FETCH_PARALLELISM: int = 25  # concurrent computePixels requests per HUC
+    PATCH_FORMAT: str = 'GEO_TIFF'  # 'GEO_TIFF' (georeferenced, LZW) or 'NPY' (raw H x W x bands arrays, no decode step)
+    SKIP_EMPTY_PATCHES: bool = True  # skip patches where a modality has no valid pixel (one check per batch)
+    TASK_POLL_MIN_INTERVAL: float = 5  # seconds between task status polls right after a change
+    TASK_POLL_MAX_INTERVAL: float = 60  # upper bound of the adaptive poll interval
+    TASK_STATUS_BY_ID_MAX: int = 10  # poll up to this many pending tasks by id; more are read from one task listing
+
+    VISUALIZE_POINTS: bool = True  # whether to visualize points on the map
+    DEBUG: bool = False  # print extra server-side diagnostics (costs additional getInfo() round-trips)
+
+
+    # Google Drive API
+    SCOPES: tuple = ('https://www.googleapis.com/auth/drive',)
+    DOWNLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024  # bytes per media request; the client default is 100 MB
+    DOWNLOAD_PARALLELISM: int = 8  # concurrent file downloads
+    HUC_PARALLELISM: int = 8  # HUC folders listed concurrently
+    DOWNLOAD_BACKEND: str = 'threads'  # 'threads' or 'asyncio' (requires aiohttp)
+    DOWNLOAD_ASYNC_CONCURRENCY: int = 64  # in-flight GETs for the asyncio backend
+    DOWNLOAD_RETRIES: int = 5  # retries (with exponential backoff) per chunk on 429/5xx
+    DRIVE_HTTP_TIMEOUT: int = 60  # socket timeout (s) of the Drive API connections
+    DRIVE_MAX_ATTEMPTS: int = 6  # attempts per Drive API call before giving up on 403-rate-limit/429/5xx
+    DOWNLOAD_STREAM_MAX_BYTES: int = 512 * 1024 * 1024  # larger files use the resumable chunked download
+    FOLDER_CACHE_TTL: int = 600  # seconds a folder name -> id lookup is reused
+    FOLDER_CACHE_NEGATIVE_TTL: int = 30  # seconds a "folder not found" result is reused
+    GDRIVE_META_CACHE: str = 'gdrive_meta.db'  # SQLite file persisting folder lookups across runs
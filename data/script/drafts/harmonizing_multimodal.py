@@ -1,15 +1,27 @@
 import os
 import re 
+import sys
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib
+# Headless runs (no X display) render straight to files with the non-interactive Agg backend
+if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+    matplotlib.use('Agg')
 import rasterio
 from rasterio.windows import Window
-from rasterio.warp import calculate_default_transform, reproject, Resampling
+from rasterio.warp import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.transform import rowcol
 from pyproj import Transformer
 import geopandas as gpd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
-from shapely.geometry import box, Point
-from rasterio.plot import show
+import shapely
+from shapely.geometry import box
+from rasterio.plot import show, plotting_extent
+import zarr
+from numcodecs import Blosc
 
 data_path = 'gee_downloads/HUC8_10020007_Madison'  # Path to the directory containing the downloaded data
 
@@ -17,17 +29,31 @@ data_path = 'gee_downloads/HUC8_10020007_Madison'  # Path to the directory conta
 patch_size = 224
 stride = 224
 
+# Open an interactive window for each figure in addition to saving it
+show_plots = False
+
+
+def save_figure(fig, save_path, show=False):
+    """Saves the figure, optionally shows it, and closes it to release its memory."""
+    fig.savefig(save_path, bbox_inches='tight', dpi=300)
+    if show:
+        plt.show()
+    plt.close(fig)
+
+
 # Load the original watershed boundary polygon
 boundary_gdf_path = os.path.join(data_path, 'Selected_1_HUC8_Original_Boundaries.geojson')
 boundary_gdf = gpd.read_file(boundary_gdf_path)
 
-# Load the 5km buffered watershed boundary polygon
-boundary_w_buffer_path = os.path.join(data_path, 'HUC8_10020007_Madison_Buffered_Boundary.geojson')
-boundary_w_buffer_gdf = gpd.read_file(boundary_w_buffer_path)
+# Load the per-HUC boundaries (original / buffered / bbox, told apart by the 'type' column)
+boundaries_path = os.path.join(data_path, 'HUC8_10020007_Madison_Boundaries.geojson')
+boundaries_gdf = gpd.read_file(boundaries_path)
+
+# The 5km buffered watershed boundary polygon
+boundary_w_buffer_gdf = boundaries_gdf[boundaries_gdf['type'] == 'buffered']
 
-# Load the bounding box of the 5km buffered area
-boundary_buffer_bb_path = os.path.join(data_path, 'HUC8_10020007_Madison_BoundingBox.geojson')
-boundary_buffer_bb_gdf = gpd.read_file(boundary_buffer_bb_path)
+# The bounding box of the 5km buffered area
+boundary_buffer_bb_gdf = boundaries_gdf[boundaries_gdf['type'] == 'bbox']
 
 # Example list of raster file paths (update to your raster paths!)
 raster_files = {
@@ -72,13 +98,50 @@ ax.set_title("Boundary Polygon and Buffers")
 ax.set_xlabel("Longitude")
 ax.set_ylabel("Latitude")
 
-# Display the plot
-plt.show()
-plt.savefig(os.path.join(data_path, 'boundary_buffers_plot.png'), bbox_inches='tight', dpi=300)
+# Save (and optionally display) the plot
+save_figure(fig, os.path.join(data_path, 'boundary_buffers_plot.png'), show=show_plots)
+
+
+# Resolution token in export file names, e.g. HUC8_..._DEM_10m_Rect.tif
+_RES_RE = re.compile(r'_(\d+)m_')
+
+
+@functools.lru_cache(maxsize=None)
+def _get_transformer(src_crs, dst_crs):
+    """Return a cached always_xy Transformer; building one hits the PROJ database."""
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
 
 
 # Function to generate patch center points
 # ----------------------------------------------
+def generate_patch_center_coords(raster_path, patch_size, stride):
+    """
+    Generate patch center coordinates (lon, lat) from a raster file as plain arrays.
+    
+    Parameters:
+        raster_path (str): Path to the raster file
+        patch_size (int): Size of the patch in pixels
+        stride (int): Stride for window movement
+
+    Returns:
+        tuple(np.ndarray, np.ndarray): Longitudes and latitudes (EPSG:4326) of the patch centers
+    """
+    with rasterio.open(raster_path) as ds:
+        # Row/column index of every patch center on the stride grid
+        rows = np.arange(0, ds.height, stride) + patch_size // 2
+        cols = np.arange(0, ds.width, stride) + patch_size // 2
+        cc, rr = np.meshgrid(cols, rows)
+
+        # Pixel center -> map coordinates for all patches in one affine transform
+        xs, ys = ds.transform * (cc.ravel() + 0.5, rr.ravel() + 0.5)
+
+        # Bring the coordinates to EPSG:4326 in a single bulk call
+        if ds.crs is not None and ds.crs.to_epsg() != 4326:
+            xs, ys = _get_transformer(ds.crs.to_wkt(), "EPSG:4326").transform(xs, ys)
+
+    return np.asarray(xs), np.asarray(ys)
+
+
 def generate_patch_centers(raster_path, patch_size, stride):
     """
     Generate patch center points (lon, lat) from a raster file.
@@ -91,26 +154,25 @@ def generate_patch_centers(raster_path, patch_size, stride):
     Returns:
         GeoDataFrame: Patch center points in EPSG:4326
     """
-    patch_coords = []
-    with rasterio.open(raster_path) as ds:
-        height, width = ds.height, ds.width
-        for r in range(0, height, stride):
-            for c in range(0, width, stride):
-                center_r = r + patch_size // 2
-                center_c = c + patch_size // 2
-                lon, lat = ds.xy(center_r, center_c)  # Convert pixel center to lon/lat
-                patch_coords.append((lon, lat))
-    
+    xs, ys = generate_patch_center_coords(raster_path, patch_size, stride)
+
     # Create GeoDataFrame of patch center points
-    patch_gdf = gpd.GeoDataFrame({'geometry': [Point(lon, lat) for lon, lat in patch_coords]}, crs='EPSG:4326')
+    patch_gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy(xs, ys), crs='EPSG:4326')
     return patch_gdf
 
-# Generate patch centers from raster
-patch_centers_gdf = generate_patch_centers(raster_files["DEM"], patch_size, stride)
-print(len(patch_centers_gdf), "patch centers generated.")
+# Generate patch center coordinates from raster
+center_xs, center_ys = generate_patch_center_coords(raster_files["DEM"], patch_size, stride)
+print(len(center_xs), "patch centers generated.")
 # Important: Make sure both are in the same CRS before spatial operation!
-# Here we assume boundary_gdf is already in EPSG:4326 (same as patch_centers_gdf)
-valid_centers_gdf = patch_centers_gdf[patch_centers_gdf.within(boundary_gdf.unary_union)]
+boundary_gdf = boundary_gdf.to_crs('EPSG:4326')
+# Union the boundary once and prepare it (builds the GEOS spatial index) for every containment test
+boundary_union = boundary_gdf.geometry.union_all()
+shapely.prepare(boundary_union)
+# Test containment on the raw coordinate arrays; Points are only built for the valid centers
+inside = shapely.contains_xy(boundary_union, center_xs, center_ys)
+valid_centers_gdf = gpd.GeoDataFrame(
+    geometry=gpd.points_from_xy(center_xs[inside], center_ys[inside]), crs='EPSG:4326'
+)
 print(len(valid_centers_gdf), "valid patch centers within the boundary.")
 # Plot boundary
 base = boundary_gdf.plot(facecolor='none', edgecolor='lime', linewidth=2)
@@ -121,15 +183,14 @@ with rasterio.open(raster_files["DEM"]) as ds:
     show(ds, ax=base, cmap='gray', alpha=0.5)
 
 # Plot all patch centers in blue
-patch_centers_gdf.plot(ax=base, color='blue', markersize=1, alpha=0.6, label='Invalid Patch Centers')
+base.scatter(center_xs, center_ys, color='blue', s=1, alpha=0.6, label='Invalid Patch Centers')
 
 # Plot valid patch centers in red
 valid_centers_gdf.plot(ax=base, color='red', markersize=1, alpha=1, label='Valid Patch Centers')
 
-plt.title("Generated Patch Centers within Boundary")
-plt.legend(loc='upper right')
-plt.show()
-plt.savefig(os.path.join(data_path, 'patch_centers_within_boundary.png'), bbox_inches='tight', dpi=300)
+base.set_title("Generated Patch Centers within Boundary")
+base.legend(loc='upper right')
+save_figure(base.figure, os.path.join(data_path, 'patch_centers_within_boundary.png'), show=show_plots)
 
 
 def extract_resolution_from_filename(filename):
@@ -137,13 +198,11 @@ def extract_resolution_from_filename(filename):
     Extracts the resolution in meters from the raster filename.
     Example filename: DEM_10m_Rect.tif -> returns 10
     """
-    match = re.search(r'_(\d+)(m)_', filename)
-    if match:
-        return int(match.group(1))
-    return None  # Return None if no resolution found
+    match = _RES_RE.search(filename)
+    return int(match.group(1)) if match else None  # Return None if no resolution found
 
 
-def visualize_real_world_patch_footprints(raster_paths, patch_centers_gdf, patch_size):
+def visualize_real_world_patch_footprints(raster_paths, patch_centers_gdf, patch_size, save_path=None, show=False):
     """
     Visualizes real-world footprints of the first patch (patch 0) for multiple rasters.
 
@@ -151,6 +210,8 @@ def visualize_real_world_patch_footprints(raster_paths, patch_centers_gdf, patch
         raster_paths (list): List of raster file paths
         patch_centers_gdf (GeoDataFrame): GeoDataFrame with patch center points in EPSG:4326
         patch_size (int): Patch size in pixels
+        save_path (str): Output image path (defaults to data_path/real_world_patch_footprints.png)
+        show (bool): Also display the figure interactively
     """
     # Create a plot
     fig, ax = plt.subplots(figsize=(10, 10))
@@ -158,33 +219,29 @@ def visualize_real_world_patch_footprints(raster_paths, patch_centers_gdf, patch
     # Plot the watershed boundary (assuming boundary_gdf is already defined)
     boundary_gdf.plot(ax=ax, facecolor='none', edgecolor='lime', linewidth=2, label='Boundary')
 
-    # Loop through each raster file
-    for raster_path in raster_paths:
-        # Extract the resolution from the filename (e.g., 10m, 30m)
-        resolution = extract_resolution_from_filename(os.path.basename(raster_path)) or 10  # Default to 10m if not found
+    # Extract the resolution from the filename (e.g., 10m, 30m)
+    resolutions = [extract_resolution_from_filename(os.path.basename(raster_path)) or 10  # Default to 10m if not found
+                   for raster_path in raster_paths]
 
-        # Use the first valid patch center point
-        center_point = patch_centers_gdf.geometry.iloc[0]
-        lon, lat = center_point.x, center_point.y
+    # Use the first valid patch center point
+    center_point = patch_centers_gdf.geometry.iloc[0]
+    lon, lat = center_point.x, center_point.y
 
-        # Convert the center point to UTM coordinates for accurate real-world (meter) sizing
-        transformer_to_utm = Transformer.from_crs("EPSG:4326", "EPSG:32616", always_xy=True)
-        utm_x, utm_y = transformer_to_utm.transform(lon, lat)
+    # Convert the center point to UTM coordinates for accurate real-world (meter) sizing
+    utm_x, utm_y = _get_transformer("EPSG:4326", "EPSG:32616").transform(lon, lat)
 
-        # Calculate half the size of the patch in meters
-        patch_half_size_m = (patch_size * resolution) / 2
+    # Calculate half the size of the patch in meters for every raster
+    patch_half_size_m = (patch_size * np.asarray(resolutions, dtype=float)) / 2
 
-        # Calculate min and max UTM coordinates for the patch footprint
-        min_x, max_x = utm_x - patch_half_size_m, utm_x + patch_half_size_m
-        min_y, max_y = utm_y - patch_half_size_m, utm_y + patch_half_size_m
-
-        # Convert back to geographic coordinates (lon/lat) for plotting
-        transformer_to_latlon = Transformer.from_crs("EPSG:32616", "EPSG:4326", always_xy=True)
-        min_lon, min_lat = transformer_to_latlon.transform(min_x, min_y)
-        max_lon, max_lat = transformer_to_latlon.transform(max_x, max_y)
+    # Convert all footprint corners back to geographic coordinates (lon/lat) in one call
+    min_lon, min_lat = _get_transformer("EPSG:32616", "EPSG:4326").transform(
+        utm_x - patch_half_size_m, utm_y - patch_half_size_m)
+    max_lon, max_lat = _get_transformer("EPSG:32616", "EPSG:4326").transform(
+        utm_x + patch_half_size_m, utm_y + patch_half_size_m)
 
+    for i, resolution in enumerate(resolutions):
         # Create a rectangular polygon (footprint of the patch) in EPSG:4326
-        patch_box = box(min_lon, min_lat, max_lon, max_lat)
+        patch_box = box(min_lon[i], min_lat[i], max_lon[i], max_lat[i])
         patch_gdf = gpd.GeoDataFrame({'geometry': [patch_box]}, crs='EPSG:4326')
 
         # Choose color based on resolution
@@ -204,13 +261,12 @@ def visualize_real_world_patch_footprints(raster_paths, patch_centers_gdf, patch
     ax.set_ylabel("Latitude")
     ax.legend()
     # plt.axis('equal')  # Keep equal aspect ratio for spatial accuracy
-    plt.show()
-    plt.savefig(os.path.join(data_path, 'real_world_patch_footprints.png'), bbox_inches='tight', dpi=300)
+    save_figure(fig, save_path or os.path.join(data_path, 'real_world_patch_footprints.png'), show=show)
 
-visualize_real_world_patch_footprints([raster_files["DEM"], raster_files["Optical"]], valid_centers_gdf, patch_size=patch_size)
+visualize_real_world_patch_footprints([raster_files["DEM"], raster_files["Optical"]], valid_centers_gdf, patch_size=patch_size, show=show_plots)
 
 
-def visualize_patch_grid_on_raster(raster_path, boundary_gdf, patch_centers_gdf, patch_size, stride):
+def visualize_patch_grid_on_raster(raster_path, boundary_gdf, patch_centers_gdf, patch_size, stride, save_path=None, show=False):
     """
     Visualizes patch grid footprints on top of the raster and boundary polygon.
     
@@ -220,39 +276,29 @@ def visualize_patch_grid_on_raster(raster_path, boundary_gdf, patch_centers_gdf,
         patch_centers_gdf (GeoDataFrame): Patch center points in EPSG:4326
         patch_size (int): Patch size in pixels
         stride (int): Stride for window movement
+        save_path (str): Output image path (defaults to data_path/patch_grid_<raster>.png)
+        show (bool): Also display the figure interactively
     """
-    # Reproject raster to EPSG:4326 to match boundary and patch centers
+    # Read a decimated preview; WarpedVRT reprojects to lon/lat lazily, only for the pixels read
     with rasterio.open(raster_path) as src:
-        transform, width, height = calculate_default_transform(
-            src.crs, 'EPSG:4326', src.width, src.height, *src.bounds)
-        kwargs = src.meta.copy()
-        kwargs.update({
-            'crs': 'EPSG:4326',
-            'transform': transform,
-            'width': width,
-            'height': height
-        })
-
-        reprojected_raster = np.empty((src.count, height, width), dtype=src.dtypes[0])
-        for i in range(1, src.count + 1):
-            reproject(
-                source=rasterio.band(src, i),
-                destination=reprojected_raster[i - 1],
-                src_transform=src.transform,
-                src_crs=src.crs,
-                dst_transform=transform,
-                dst_crs='EPSG:4326',
-                resampling=Resampling.nearest
+        if src.crs == 'EPSG:4326':
+            view = src
+        else:
+            view = WarpedVRT(src, crs='EPSG:4326', resampling=Resampling.nearest)
+        with view:
+            scale = max(1, max(view.width, view.height) // 2048)
+            preview = view.read(
+                1,
+                out_shape=(max(1, view.height // scale), max(1, view.width // scale)),
+                resampling=Resampling.average
             )
-
-    # Compute raster extent for plotting
-    min_lon, max_lat = transform * (0, 0)
-    max_lon, min_lat = transform * (width, height)
-    extent = (min_lon, max_lon, min_lat, max_lat)
+            # plotting_extent returns (left, right, bottom, top) for imshow
+            extent = plotting_extent(view)
+            pixel_res = view.res
 
     # Plot raster
     fig, ax = plt.subplots(figsize=(10, 10))
-    ax.imshow(reprojected_raster[0], cmap='gray', extent=extent, alpha=0.8)
+    ax.imshow(preview, cmap='gray', extent=extent, alpha=0.8)
 
     # Plot the watershed boundary
     boundary_gdf.plot(ax=ax, facecolor='none', edgecolor='lime', linewidth=1)
@@ -260,17 +306,19 @@ def visualize_patch_grid_on_raster(raster_path, boundary_gdf, patch_centers_gdf,
     # Plot valid patch centers
     patch_centers_gdf.plot(ax=ax, color='red', markersize=5, alpha=0.7, label='Patch Centers')
 
-    # Create patch grid footprints (yellow rectangles)
-    for center_point in patch_centers_gdf.geometry:
-        lon, lat = center_point.x, center_point.y
-        # Calculate footprint in lon/lat
-        half_pixel_deg_x = (patch_size * src.res[0]) / 2
-        half_pixel_deg_y = (patch_size * src.res[1]) / 2
-        min_x, max_x = lon - half_pixel_deg_x, lon + half_pixel_deg_x
-        min_y, max_y = lat - half_pixel_deg_y, lat + half_pixel_deg_y
-        rect = box(min_x, min_y, max_x, max_y)
-        patch_gdf = gpd.GeoDataFrame({'geometry': [rect]}, crs='EPSG:4326')
-        patch_gdf.plot(ax=ax, facecolor='none', edgecolor='yellow', linewidth=1, alpha=0.5)
+    # Create patch grid footprints (yellow rectangles); the half size in degrees only depends on the raster
+    half_pixel_deg_x = (patch_size * pixel_res[0]) / 2
+    half_pixel_deg_y = (patch_size * pixel_res[1]) / 2
+    lons = patch_centers_gdf.geometry.x.to_numpy()
+    lats = patch_centers_gdf.geometry.y.to_numpy()
+    rects = shapely.box(
+        lons - half_pixel_deg_x, lats - half_pixel_deg_y,
+        lons + half_pixel_deg_x, lats + half_pixel_deg_y
+    )
+
+    # Draw every footprint with a single plot call (one collection instead of one artist per patch)
+    patch_gdf = gpd.GeoDataFrame(geometry=rects, crs='EPSG:4326')
+    patch_gdf.boundary.plot(ax=ax, color='yellow', linewidth=1, alpha=0.5)
 
     # Final plot styling
     res = extract_resolution_from_filename(raster_path)
@@ -279,15 +327,15 @@ def visualize_patch_grid_on_raster(raster_path, boundary_gdf, patch_centers_gdf,
     ax.set_ylabel("Latitude")
     ax.legend(loc='lower left', frameon=True)
     ax.set_aspect('equal')
-    plt.show()
-    plt.savefig(os.path.join(data_path, f'patch_grid_{os.path.basename(raster_path)}.png'), bbox_inches='tight', dpi=300)
+    save_figure(fig, save_path or os.path.join(data_path, f'patch_grid_{os.path.basename(raster_path)}.png'), show=show)
 
 visualize_patch_grid_on_raster(
     raster_path=raster_files["DEM"],
     patch_centers_gdf=valid_centers_gdf,
     boundary_gdf=boundary_gdf,
     patch_size=patch_size,
-    stride=stride
+    stride=stride,
+    show=show_plots
 )
 
 visualize_patch_grid_on_raster(
@@ -295,43 +343,37 @@ visualize_patch_grid_on_raster(
     patch_centers_gdf=valid_centers_gdf,
     boundary_gdf=boundary_gdf,
     patch_size=patch_size,
-    stride=stride
+    stride=stride,
+    show=show_plots
 )
 
-def extract_patch_data_and_extent(raster_path, center_point, patch_size, pad_value=0):
-    with rasterio.open(raster_path) as ds:
-        transform = ds.transform
-        width, height = ds.width, ds.height
-
-        # Convert center point to pixel coordinates
-        target_r, target_c = ds.index(center_point.x, center_point.y)
-
-        # Calculate window
-        window_r = target_r - patch_size // 2
-        window_c = target_c - patch_size // 2
-        window = rasterio.windows.Window(window_c, window_r, patch_size, patch_size)
-
-        # Compute actual intersection window
-        full_window = rasterio.windows.Window(0, 0, width, height)
-        actual_window = window.intersection(full_window)
-
-        # Read data
-        data = ds.read(window=actual_window)
-
-        # Pad data if needed
-        padded_patch = np.full((ds.count, patch_size, patch_size), pad_value, dtype=ds.dtypes[0])
-        row_off = max(0, -window_r)
-        col_off = max(0, -window_c)
-        padded_patch[:, row_off:row_off + actual_window.height, col_off:col_off + actual_window.width] = data
-
-        # Calculate real-world extent (lon/lat)
-        min_lon, max_lat = transform * (window_c, window_r)
-        max_lon, min_lat = transform * (window_c + patch_size, window_r + patch_size)
-        extent = (min_lon, max_lon, min_lat, max_lat)
+def to_layout(patch, layout='CHW'):
+    """
+    Returns a (bands, H, W) patch as-is for 'CHW', or as a contiguous (H, W, bands) array for 'HWC',
+    which is what imshow expects (a bare transpose view would be copied again inside matplotlib).
+    """
+    if layout == 'HWC':
+        return np.ascontiguousarray(patch.transpose(1, 2, 0))
+    return patch
+
+def extract_patch_data_and_extent(ds, center_point, patch_size, pad_value=0, layout='CHW'):
+    """Extracts patch data (in `layout`, see to_layout) and its lon/lat extent from an already opened dataset."""
+    transform = ds.transform
+
+    # Convert center point to pixel coordinates and read the (padded) patch
+    rows, cols = rowcol(transform, [center_point.x], [center_point.y], op=np.floor)
+    window_r = int(rows[0]) - patch_size // 2
+    window_c = int(cols[0]) - patch_size // 2
+    padded_patch = extract_patches(ds, [center_point.x], [center_point.y], patch_size, pad_value)[0]
+
+    # Calculate real-world extent (lon/lat)
+    min_lon, max_lat = transform * (window_c, window_r)
+    max_lon, min_lat = transform * (window_c + patch_size, window_r + patch_size)
+    extent = (min_lon, max_lon, min_lat, max_lat)
 
-        return padded_patch, extent
+    return to_layout(padded_patch, layout), extent
 
-def visualize_real_world_patch_data(raster_dict, patch_centers_gdf, boundary_gdf, patch_size, pad_value=0):
+def visualize_real_world_patch_data(raster_dict, patch_centers_gdf, boundary_gdf, patch_size, pad_value=0, save_path=None, show=False):
     """Visualizes the data of the first patch from each raster, using a dictionary for inputs."""
     num_rasters = len(raster_dict)
     fig, axes = plt.subplots(1, num_rasters, figsize=(6 * num_rasters, 7), constrained_layout=True)
@@ -339,26 +381,31 @@ def visualize_real_world_patch_data(raster_dict, patch_centers_gdf, boundary_gdf
     if num_rasters == 1:
         axes = [axes]
 
+    # Use the first valid center point for demonstration
+    center_point = patch_centers_gdf.geometry.iloc[0]
+    lon, lat = center_point.x, center_point.y
+
+    def read_patch(raster_path):
+        # Extract patch data and its geographic extent
+        with rasterio.Env(GDAL_CACHEMAX=512), rasterio.open(raster_path) as ds:
+            return extract_patch_data_and_extent(ds, center_point, patch_size, pad_value, layout='HWC')
+
+    # Reads are I/O bound and GDAL releases the GIL, so fetch every modality concurrently;
+    # plotting below stays on this thread because matplotlib is not thread-safe
+    with ThreadPoolExecutor(max_workers=num_rasters) as executor:
+        patches = list(executor.map(read_patch, raster_dict.values()))
+
     # Iterate through the dictionary's items (label, path)
-    for ax, (label, raster_path) in zip(axes, raster_dict.items()):
+    for ax, (label, raster_path), (patch_data, extent) in zip(axes, raster_dict.items(), patches):
         resolution = extract_resolution_from_filename(raster_path)
         if resolution is None:
             resolution = 10 # Default resolution
 
-        # Use the first valid center point for demonstration
-        center_point = patch_centers_gdf.geometry.iloc[0]
-        lon, lat = center_point.x, center_point.y
-
-        # Extract patch data and its geographic extent
-        patch_data, extent = extract_patch_data_and_extent(
-            raster_path, center_point, patch_size, pad_value
-        )
-
         # Plot the patch data using its real-world extent
-        if patch_data.shape[0] == 1: # Grayscale
-            ax.imshow(patch_data[0], cmap='viridis', extent=extent, origin='upper', alpha=0.8)
+        if patch_data.shape[2] == 1: # Grayscale
+            ax.imshow(patch_data[:, :, 0], cmap='viridis', extent=extent, origin='upper', alpha=0.8)
         else: # Assumes RGB for multi-band
-            ax.imshow(np.transpose(patch_data[:3], (1, 2, 0)), extent=extent, origin='upper', alpha=0.8)
+            ax.imshow(patch_data[:, :, :3], extent=extent, origin='upper', alpha=0.8)
 
         # Overlay the boundary for context
         boundary_gdf.plot(ax=ax, facecolor='none', edgecolor='lime', linewidth=2, alpha=1.0)
@@ -373,29 +420,149 @@ def visualize_real_world_patch_data(raster_dict, patch_centers_gdf, boundary_gdf
         ax.tick_params(axis='x', rotation=45)
         ax.legend()
 
-    plt.suptitle("Real-World Spatial Extent of Patch 0 Data", fontsize=18)
-    plt.show()
-    plt.savefig(os.path.join(data_path, 'real_world_patch_data.png'), bbox_inches='tight', dpi=300)
+    fig.suptitle("Real-World Spatial Extent of Patch 0 Data", fontsize=18)
+    save_figure(fig, save_path or os.path.join(data_path, 'real_world_patch_data.png'), show=show)
 
 
-def extract_patch_data(raster_path, center_point, patch_size, pad_value=0):
-    """Extracts patch data around a geographic center point."""
-    with rasterio.open(raster_path) as ds:
-        # Convert center point to pixel coordinates
-        target_r, target_c = ds.index(center_point.x, center_point.y)
+def extract_patches(ds, xs, ys, patch_size, pad_value=0, max_tile=4096):
+    """
+    Extracts one patch per center point with as few windowed reads as possible.
+
+    Centers are grouped into super-tiles of at most `max_tile` pixels per side; each
+    group is read once (boundless, padded with `pad_value`) and the individual
+    patches are sliced out of that block with numpy.
+
+    Parameters:
+        ds (DatasetReader): Open rasterio dataset
+        xs, ys (array-like): Center point coordinates in the dataset CRS
+        patch_size (int): Patch size in pixels
+        pad_value (int/float): Fill value for pixels outside the raster
+        max_tile (int): Upper bound on the side length of a single read
+
+    Returns:
+        np.ndarray: Patches with shape (N, bands, patch_size, patch_size)
+    """
+    # One vectorized inverse-affine for every center
+    rows, cols = rowcol(ds.transform, np.atleast_1d(xs), np.atleast_1d(ys), op=np.floor)
+    row_offs = np.asarray(rows, dtype=np.int64) - patch_size // 2
+    col_offs = np.asarray(cols, dtype=np.int64) - patch_size // 2
+
+    patches = np.full((len(row_offs), ds.count, patch_size, patch_size), pad_value, dtype=ds.dtypes[0])
+
+    # Bucket the centers so that one read never grows beyond max_tile + patch_size pixels
+    tile_keys = np.stack([row_offs // max_tile, col_offs // max_tile], axis=1)
+    _, groups = np.unique(tile_keys, axis=0, return_inverse=True)
+
+    for group in np.unique(groups):
+        members = np.flatnonzero(groups == group)
+        row_off = row_offs[members].min()
+        col_off = col_offs[members].min()
+        window = Window(
+            col_off, row_off,
+            col_offs[members].max() - col_off + patch_size,
+            row_offs[members].max() - row_off + patch_size
+        )
+        block = ds.read(window=window, boundless=True, fill_value=pad_value)
+        for i in members:
+            r, c = row_offs[i] - row_off, col_offs[i] - col_off
+            patches[i] = block[:, r:r + patch_size, c:c + patch_size]
+
+    return patches
+
+
+def extract_patch_data(ds, center_point, patch_size, pad_value=0, layout='CHW'):
+    """Extracts patch data (in `layout`, see to_layout) around a geographic center point from an already opened dataset."""
+    return to_layout(extract_patches(ds, [center_point.x], [center_point.y], patch_size, pad_value)[0], layout)
+
+def build_patch_store(raster_files_dict, patch_centers_gdf, patch_size, zarr_path, pad_value=0, chunk_centers=256,
+                      max_workers=8):
+    """
+    Extracts the patches of every raster once and persists them in a chunked Zarr store.
+
+    Each modality becomes an array of shape (N, bands, patch_size, patch_size) chunked
+    one patch per chunk, so later runs read single patches without touching the GeoTIFFs.
+
+    Parameters:
+        raster_files_dict (dict): Modality label -> raster path
+        patch_centers_gdf (GeoDataFrame): Patch center points
+        patch_size (int): Patch size in pixels
+        zarr_path (str): Output directory of the Zarr store
+        pad_value (int/float): Fill value for pixels outside the raster
+        chunk_centers (int): Number of centers extracted per read pass
+        max_workers (int): Upper bound on modalities processed concurrently
+
+    Returns:
+        zarr.Group: The written store
+    """
+    xs = patch_centers_gdf.geometry.x.to_numpy()
+    ys = patch_centers_gdf.geometry.y.to_numpy()
+
+    root = zarr.open_group(zarr_path, mode='w')
+    root.attrs['complete'] = False  # set last, so a store left by a crashed build is never reused
+    root.attrs['patch_size'] = patch_size
+    root.array('center_x', xs)
+    root.array('center_y', ys)
+
+    compressor = Blosc(cname='zstd', clevel=3, shuffle=Blosc.BITSHUFFLE)
+
+    def store_modality(item):
+        label, raster_path = item
+        with rasterio.Env(GDAL_CACHEMAX=512), rasterio.open(raster_path) as ds:
+            patches = root.create_dataset(
+                label,
+                shape=(len(xs), ds.count, patch_size, patch_size),
+                chunks=(1, ds.count, patch_size, patch_size),
+                dtype=ds.dtypes[0],
+                compressor=compressor
+            )
+            patches.attrs['source'] = os.path.basename(raster_path)
+            patches.attrs['resolution'] = extract_resolution_from_filename(raster_path)
+            for start in range(0, len(xs), chunk_centers):
+                end = start + chunk_centers
+                patches[start:end] = extract_patches(ds, xs[start:end], ys[start:end], patch_size, pad_value)
 
-        # Calculate window
-        window_r = target_r - patch_size // 2
-        window_c = target_c - patch_size // 2
-        window = rasterio.windows.Window(window_c, window_r, patch_size, patch_size)
+    # Modalities are independent and GDAL releases the GIL while reading, so use a bounded thread pool
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(raster_files_dict))) as executor:
+        list(executor.map(store_modality, raster_files_dict.items()))
 
-        # Read data using boundless=True to handle edges
-        patch_data = ds.read(window=window, boundless=True, fill_value=pad_value)
+    root.attrs['complete'] = True
+    return root
 
-        return patch_data
 
-def visualize_patch_data(raster_files_dict, patch_centers_gdf, patch_size, pad_value=0):
-    """Visualizes the data of the first patch from each raster in pixel coordinates (Row/Column)."""
+def open_patch_store(zarr_path, raster_files_dict, patch_centers_gdf, patch_size):
+    """
+    Opens an existing patch store (see build_patch_store) read-only if it is complete and was built
+    for the same modalities, patch size and patch centers; returns None otherwise (rebuild it).
+    """
+    if not os.path.exists(zarr_path):
+        return None
+    try:
+        root = zarr.open_group(zarr_path, mode='r')
+    except Exception as e:  # not a readable Zarr group (e.g. a half-created directory)
+        print(f"Patch store {zarr_path} is unreadable ({e}), rebuilding.")
+        return None
+
+    xs = patch_centers_gdf.geometry.x.to_numpy()
+    ys = patch_centers_gdf.geometry.y.to_numpy()
+    if not root.attrs.get('complete', False):
+        reason = 'incomplete'
+    elif root.attrs.get('patch_size') != patch_size:
+        reason = f"patch size {root.attrs.get('patch_size')} != {patch_size}"
+    elif any(label not in root for label in raster_files_dict):
+        reason = 'missing modalities'
+    elif not (np.array_equal(root['center_x'][:], xs) and np.array_equal(root['center_y'][:], ys)):
+        reason = 'different patch centers'
+    else:
+        return root
+    print(f"Patch store {zarr_path} is stale ({reason}), rebuilding.")
+    return None
+
+
+def visualize_patch_data(raster_files_dict, patch_centers_gdf, patch_size, pad_value=0, patch_store=None, save_path=None, show=False):
+    """
+    Visualizes the data of the first patch from each raster in pixel coordinates (Row/Column).
+    If `patch_store` (see build_patch_store) is given, patches are read from it instead of the rasters.
+    """
     num_rasters = len(raster_files_dict)
     fig, axes = plt.subplots(1, num_rasters, figsize=(6 * num_rasters, 7), constrained_layout=True)
 
@@ -410,16 +577,20 @@ def visualize_patch_data(raster_files_dict, patch_centers_gdf, patch_size, pad_v
         # Use the first valid center point for demonstration
         center_point = patch_centers_gdf.geometry.iloc[0]
 
-        # Extract patch data
-        patch_data = extract_patch_data(
-            raster_path, center_point, patch_size, pad_value
-        )
+        # Extract patch data (one dataset handle serves every read from this raster)
+        if patch_store is not None and label in patch_store:
+            patch_data = to_layout(patch_store[label][0], 'HWC')
+        else:
+            with rasterio.Env(GDAL_CACHEMAX=512), rasterio.open(raster_path) as ds:
+                patch_data = extract_patch_data(
+                    ds, center_point, patch_size, pad_value, layout='HWC'
+                )
 
         # Plot the patch data using its pixel dimensions
-        if patch_data.shape[0] == 1: # Grayscale
-            ax.imshow(patch_data[0], cmap='viridis', origin='upper', alpha=0.8)
+        if patch_data.shape[2] == 1: # Grayscale
+            ax.imshow(patch_data[:, :, 0], cmap='viridis', origin='upper', alpha=0.8)
         else: # RGB
-            ax.imshow(np.transpose(patch_data[:3], (1, 2, 0)), origin='upper', alpha=0.8)
+            ax.imshow(patch_data[:, :, :3], origin='upper', alpha=0.8)
 
         # Plot the center pixel
         center_pixel = patch_size // 2
@@ -430,9 +601,14 @@ def visualize_patch_data(raster_files_dict, patch_centers_gdf, patch_size, pad_v
         ax.set_ylabel("Row")
         ax.legend()
 
-    plt.suptitle(f"Patch Data (Pixel Coordinates: {patch_size}x{patch_size})", fontsize=18)
-    plt.show()
-    plt.savefig(os.path.join(data_path, 'patch_data_pixel_coordinates.png'), bbox_inches='tight', dpi=300)
+    fig.suptitle(f"Patch Data (Pixel Coordinates: {patch_size}x{patch_size})", fontsize=18)
+    save_figure(fig, save_path or os.path.join(data_path, 'patch_data_pixel_coordinates.png'), show=show)
     
-visualize_real_world_patch_data(raster_files, valid_centers_gdf, boundary_gdf, patch_size)
-visualize_patch_data(raster_files, valid_centers_gdf, patch_size)
\ No newline at end of file
+visualize_real_world_patch_data(raster_files, valid_centers_gdf, boundary_gdf, patch_size, show=show_plots)
+# Persist the extracted patches once; later runs read them straight from the Zarr store
+patch_store_path = os.path.join(data_path, 'patches.zarr')
+patch_store = open_patch_store(patch_store_path, raster_files, valid_centers_gdf, patch_size)
+if patch_store is None:
+    patch_store = build_patch_store(raster_files, valid_centers_gdf, patch_size, patch_store_path)
+
+visualize_patch_data(raster_files, valid_centers_gdf, patch_size, patch_store=patch_store, show=show_plots)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+import asyncio
+from google.auth.transport.requests import Request
+from drive_manager import DRIVE_MEDIA_URL, RETRYABLE_STATUSES, open_file_limit, _backoff_delay
+
+try:
+    import aiohttp
+except ImportError:  # optional: only needed for DOWNLOAD_BACKEND = 'asyncio'
+    aiohttp = None
+
+try:
+    import aiofiles
+except ImportError:  # optional: writes fall back to asyncio.to_thread
+    aiofiles = None
+
+
+async def _write_sink(path, chunks):
+    """Write an async iterator of byte chunks to path without blocking the event loop."""
+    if aiofiles is not None:
+        async with aiofiles.open(path, 'wb') as fh:
+            async for chunk in chunks:
+                await fh.write(chunk)
+        return
+
+    fh = await asyncio.to_thread(open, path, 'wb')
+    try:
+        async for chunk in chunks:
+            await asyncio.to_thread(fh.write, chunk)
+    finally:
+        await asyncio.to_thread(fh.close)
+
+
+class AsyncDriveClient:
+    """
+    Minimal asyncio Drive client for the download fan-out.
+
+    One aiohttp session keeps up to `concurrency` file GETs in flight without an OS
+    thread per request; the google-auth credentials are only used for the bearer token
+    (and refreshed when they expire).
+    """
+
+    def __init__(self, creds, concurrency=64, max_attempts=6):
+        if aiohttp is None:
+            raise ImportError("AsyncDriveClient requires aiohttp (pip install aiohttp)")
+        self.creds = creds
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._fd_semaphore = asyncio.Semaphore(open_file_limit())  # open download sinks
+        self._refresh_lock = asyncio.Lock()
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def _refresh(self, force=False):
+        """Refresh expired (or, with force, rejected) credentials in a worker thread, once for all waiting downloads."""
+        async with self._refresh_lock:
+            if force or not self.creds.valid:
+                # google-auth refreshes with a blocking HTTP call; keep it off the event loop
+                await asyncio.to_thread(self.creds.refresh, Request())
+
+    async def _headers(self):
+        if not self.creds.valid:
+            await self._refresh()
+        return {'Authorization': f'Bearer {self.creds.token}'}
+
+    async def download(self, file_id, path):
+        """
+        Stream one Drive file to path (via '<path>.part', replaced once complete), retrying 401
+        (token refresh), 429 and 5xx responses as well as connection errors and timeouts.
+        """
+        url = DRIVE_MEDIA_URL.format(file_id=file_id)
+        async with self._semaphore:
+            for attempt in range(self.max_attempts):
+                last_attempt = attempt + 1 == self.max_attempts
+                retry_after = None
+                try:
+                    async with self._session.get(url, headers=await self._headers()) as response:
+                        if response.status == 401 and not last_attempt:
+                            await self._refresh(force=True)
+                            continue
+                        if response.status not in RETRYABLE_STATUSES or last_attempt:
+                            response.raise_for_status()
+                            async with self._fd_semaphore:
+                                await _write_sink(f'{path}.part', response.content.iter_chunked(1 << 20))
+                            os.replace(f'{path}.part', path)
+                            print(f"  Download finished: {path}")
+                            return
+                        retry_after = response.headers.get('Retry-After')
+                except (aiohttp.ClientResponseError, asyncio.CancelledError):
+                    raise  # non-retryable status (raise_for_status above) or cancelled
+                except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                    if last_attempt:
+                        raise
+                    print(f"  Download of {path} failed ({error!r}), retrying...")
+
+                # back off outside the response block so the connection goes back to the pool
+                if retry_after and retry_after.isdigit():
+                    delay = float(retry_after)
+                else:
+                    delay = _backoff_delay(attempt)
+                await asyncio.sleep(delay)
+
+    async def download_all(self, items):
+        """
+        Download every {'id', 'path'} item concurrently. A failed download does not cancel the
+        others; its partial file is removed and the first error is raised once all have finished.
+        """
+        results = await asyncio.gather(*(self.download(item['id'], item['path']) for item in items),
+                                       return_exceptions=True)
+        errors = []
+        for item, result in zip(items, results):
+            if isinstance(result, BaseException):
+                print(f"  Download of {item['path']} failed: {result!r}")
+                if os.path.exists(f"{item['path']}.part"):
+                    os.remove(f"{item['path']}.part")
+                errors.append(result)
+        if errors:
+            raise errors[0]
+
+
+def download_files(creds, items, concurrency=64, max_attempts=6):
+    """Blocking entry point: download items with an AsyncDriveClient on a fresh event loop."""
+    async def run():
+        async with AsyncDriveClient(creds, concurrency, max_attempts) as client:
+            await client.download_all(items)
+
+    asyncio.run(run())
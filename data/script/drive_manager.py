@@ -1,29 +1,93 @@
 import os
 import time
 import io
+import random
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from config import Settings
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import Request, AuthorizedSession
+from requests import RequestException
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+
+# Drive rejects batch requests with more than 100 sub-requests
+DRIVE_BATCH_LIMIT = 100
+# parent IDs OR-ed into one files.list query (keeps the query string well below the URL limit)
+FOLDER_QUERY_CHUNK = 50
+# files.list query templates (filled with str.format)
+FOLDER_BY_NAME_QUERY = "mimeType='application/vnd.google-apps.folder' and name='{name}' and trashed=false"
+CHILDREN_QUERY = "'{parent_id}' in parents"
+DRIVE_MEDIA_URL = 'https://www.googleapis.com/drive/v3/files/{file_id}?alt=media'
+# transient Drive errors; 403 is only retried for its rate-limit reasons
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def open_file_limit():
+    """Concurrent download sinks allowed: min(32, RLIMIT_NOFILE / 4), so workers never hit EMFILE."""
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return 32
+    soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft_limit == resource.RLIM_INFINITY:
+        return 32
+    return max(1, min(32, soft_limit // 4))
+
+
+def _escape_query(value):
+    """Escape a string literal for a Drive query (backslash and single quote are backslash-escaped)."""
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+def _is_retryable(error):
+    """True for Drive errors worth retrying: rate limits (403/429) and transient server errors."""
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 403:
+        return any(reason in str(error.content) for reason in RATE_LIMIT_REASONS)
+    return error.resp.status in RETRYABLE_STATUSES
+
+
+def _backoff_delay(attempt, error=None):
+    """Seconds to wait before the next attempt: the server's Retry-After if given, else 2^n s plus jitter."""
+    retry_after = error.resp.get('retry-after') if error is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return 2 ** attempt + random.random()
 
 
 class GoogleDriveManager:
     
     def __init__(self, settings:Settings):
         self.settings = settings
+        self.creds = None
+        self._local = threading.local()  # per-thread Drive services for parallel downloads
+        self._folder_cache = {}  # (lookup, folder name, parent id) -> (expires at, result)
+        self._folder_cache_lock = threading.Lock()
+        self._meta_db = self._open_meta_db()  # persists positive folder lookups across runs
+        self._fd_semaphore = threading.BoundedSemaphore(open_file_limit())
         self.service = self._authenticate()
+        self._local.service = self.service  # the constructing thread reuses the main service
     
     def _authenticate(self):
         creds = None
-        SCOPES = ['https://www.googleapis.com/auth/drive']
+        SCOPES = list(self.settings.SCOPES)
         if os.path.exists('token.json'):
             creds = Credentials.from_authorized_user_file('token.json', SCOPES)
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 creds.refresh(Request())
+                # Persist the refreshed token so later runs and worker processes skip the refresh
+                with open('token.json', 'w') as token_file:
+                    token_file.write(creds.to_json())
             else:
                 flow = InstalledAppFlow.from_client_secrets_file(
                     self.settings.GDRIVE_CREDENTIALS_FILE,
@@ -41,190 +105,520 @@ class GoogleDriveManager:
                 with open('token.json', 'w') as token_file:
                     token_file.write(creds.to_json())
         
+        self.creds = creds
         try:
-            service = build('drive', 'v3', credentials=creds)
+            service = self._build_service()
             print("Google Drive API successfully initialized.")
             return service
         except HttpError as error:
             print(f'Error occur when launched Google Drive service: {error}')
             return None
         
-    def merge_duplicate_folders(self, folder_name):
+    def _list_children_page(self, parent_ids, page_token):
         """
-        Search for all folders with the specified name in Google Drive,
-        merge their contents into the first found folder, and delete the others.
-        :param drive_service: Google Drive API service instance
-        :param folder_name: The name of the folders to search for and merge
+        One files.list page of the non-trashed children of any of parent_ids (at most FOLDER_QUERY_CHUNK,
+        OR-ed into one query); uses the calling thread's service, so it is safe to call from any thread.
         """
-        print(f"\n--- Searching named '{folder_name}' folder ---")
-        
-        try:
-            # search for folders with the specified name
-            query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
-            fields = "files(id, name, parents)"
-            results = self.service.files().list(q=query, fields=fields, spaces='drive').execute()
-            folders = results.get('files', [])
-
-            if len(folders) <= 1:
-                print(f"Found {len(folders)} folders named '{folder_name}'. No need to merge.")
-                return
+        query = " or ".join(CHILDREN_QUERY.format(parent_id=fid) for fid in parent_ids)
+        return self._execute(self._thread_service().files().list(
+            q=f"({query}) and trashed=false",
+            fields="nextPageToken, files(id, name, parents)",
+            spaces='drive',
+            pageSize=1000,
+            pageToken=page_token
+        ))
 
-            print(f"Found {len(folders)} folders. Get ready to merge...")
-            time.sleep(2) 
+    def _execute(self, request):
+        """Execute a Drive request, backing off exponentially (with jitter) on rate-limit and 5xx errors."""
+        for attempt in range(self.settings.DRIVE_MAX_ATTEMPTS):
+            try:
+                return request.execute()
+            except HttpError as error:
+                if attempt + 1 == self.settings.DRIVE_MAX_ATTEMPTS or not _is_retryable(error):
+                    raise
+                delay = _backoff_delay(attempt, error)
+                print(f"Drive API returned {error.resp.status}, retrying in {delay:.1f}s...")
+                time.sleep(delay)
 
-            # Specify the first folder as the target and the rest as the sources
-            target_folder = folders.pop(0)
-            source_folders = folders
-            
-            print(f"Target folder: '{target_folder['name']}' (ID: {target_folder['id']})")
+    def _move_items(self, items, target_folder_id=None):
+        """
+        Reparent Drive items into the target folder, sending up to DRIVE_BATCH_LIMIT
+        updates per batch HTTP request instead of one round-trip per item.
+        Sub-requests that fail with a retryable error are re-queued into the next round.
+        :param items: Drive file resources with 'id', 'name' and 'parents' (and optionally
+            their own 'target' folder ID, so moves into different folders share batches)
+        :param target_folder_id: ID of the folder items without a 'target' are moved into
+        """
+        by_id = {item['id']: item for item in items}
+        pending = list(items)
 
-            # Traverse all the source folders
-            for source in source_folders:
-                print(f"\n--- Processing source folder: '{source['name']}' (ID: {source['id']}) ---")
-                
-                page_token = None
-                while True:
-                    # search for all items in the source folder
-                    response = self.service.files().list(
-                        q=f"'{source['id']}' in parents and trashed=false",
-                        fields="nextPageToken, files(id, name, parents)",
-                        spaces='drive',
-                        pageToken=page_token
-                    ).execute()
-                    
-                    items_to_move = response.get('files', [])
+        for attempt in range(self.settings.DRIVE_MAX_ATTEMPTS):
+            retry = []
+            last_attempt = attempt + 1 == self.settings.DRIVE_MAX_ATTEMPTS
 
-                    if not items_to_move:
-                        print("There is no content to be moved in this source folder")
-                        break
+            def on_move_done(request_id, response, exception):
+                if exception is None:
+                    return
+                if _is_retryable(exception) and not last_attempt:
+                    retry.append(by_id[request_id])
+                else:
+                    print(f"    An error {exception} occurred when moving item '{by_id[request_id]['name']}'")
 
-                    # move each item to the target folder
-                    for item in items_to_move:
+            for start in range(0, len(pending), DRIVE_BATCH_LIMIT):
+                batch = self._thread_service().new_batch_http_request(callback=on_move_done)
+                for item in pending[start:start + DRIVE_BATCH_LIMIT]:
+                    if attempt == 0:
                         print(f"  Moving: '{item['name']}' (ID: {item['id']})")
-                        previous_parents = ",".join(item.get('parents', []))
-                        
-                        try:
-                            self.service.files().update(
-                                fileId=item['id'],
-                                addParents=target_folder['id'],
-                                removeParents=previous_parents,
-                                fields='id, parents'
-                            ).execute()
-                        except HttpError as error:
-                            print(f"    An error {error} occurred when moving item '{item['name']}'")
+                    batch.add(
+                        self._files.update(
+                            fileId=item['id'],
+                            addParents=item.get('target', target_folder_id),
+                            removeParents=",".join(item.get('parents', [])),
+                            fields='id'
+                        ),
+                        request_id=item['id']
+                    )
+                self._execute(batch)
 
-                    page_token = response.get('nextPageToken', None)
-                    if page_token is None:
-                        break
-                
-                # Delete the emptied source folder
-                print(f"--- Source folder '{source['name']}' is empty, ready to delete ---")
-                try:
-                    self.service.files().delete(fileId=source['id']).execute()
-                    print(f"Successfully deleted the folder (ID: {source['id']})")
-                except HttpError as error:
-                    print(f"A error{error} occur when deleting folder '{source['name']}'. ")
+            if not retry:
+                break
+            delay = _backoff_delay(attempt)
+            print(f"  {len(retry)} moves were rate limited, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            pending = retry
 
-            print("\n--- All duplicate folders have been merged successfully! ---")
+    def _delete_items(self, items):
+        """Delete Drive items ({'id', 'name'}) with up to DRIVE_BATCH_LIMIT deletes per batch HTTP request."""
+        by_id = {item['id']: item for item in items}
 
-        except HttpError as error:
-            print(f"An error occurred when performing the merge operation: {error}")
+        def on_delete_done(request_id, response, exception):
+            if exception is None:
+                print(f"Successfully deleted the folder (ID: {request_id})")
+            else:
+                print(f"A error{exception} occur when deleting folder '{by_id[request_id]['name']}'. ")
 
+        for start in range(0, len(items), DRIVE_BATCH_LIMIT):
+            batch = self._thread_service().new_batch_http_request(callback=on_delete_done)
+            for item in items[start:start + DRIVE_BATCH_LIMIT]:
+                batch.add(self._files.delete(fileId=item['id']), request_id=item['id'])
+            self._execute(batch)
 
-    def move_folder(self, folder_to_move_name, destination_folder_name):   
-        print(f"\n--- Prepare to put the folder '{folder_to_move_name}' to '{destination_folder_name}' ---")
+    def _find_folders(self, folder_names):
+        """
+        Look up every folder named in folder_names, OR-ing up to FOLDER_QUERY_CHUNK names
+        into one files.list query.
+        :return: dict name -> list of {'id', 'name', 'parents'} (empty list when not found)
+        """
+        found = {name: [] for name in folder_names}
+        for start in range(0, len(folder_names), FOLDER_QUERY_CHUNK):
+            chunk = folder_names[start:start + FOLDER_QUERY_CHUNK]
+            names = " or ".join(f"name='{_escape_query(name)}'" for name in chunk)
+            query = f"mimeType='application/vnd.google-apps.folder' and trashed=false and ({names})"
+            page_token = None
+            while True:
+                response = self._execute(self._files.list(
+                    q=query, fields="nextPageToken, files(id, name, parents)",
+                    spaces='drive', pageSize=1000, pageToken=page_token
+                ))
+                for folder in response.get('files', []):
+                    if folder['name'] in found:
+                        found[folder['name']].append(folder)
+                page_token = response.get('nextPageToken', None)
+                if page_token is None:
+                    break
+        return found
 
-        folder_a_id, original_parent_id = self.get_folder_info(folder_to_move_name)
-        if not folder_a_id or not original_parent_id:
-            print("Cannot continue the move operation because the source folder does not exist or is not accessible.")
-            return
+    def merge_and_move_folders(self, folder_names, destination_folder_name):
+        """
+        Merge the duplicates of every named folder into one and move it into the destination folder.
+        The folder lookups, the children listings and every reparenting call are shared between
+        all names, so the whole reorganization costs a handful of batch requests instead of
+        several round-trips per name.
+        :param folder_names: Names of the (possibly duplicated) folders to merge
+        :param destination_folder_name: Folder that receives the merged folders
+        """
+        folder_names = list(folder_names)
+        print(f"\n--- Merging {len(folder_names)} folder name(s) into '{destination_folder_name}' ---")
+        try:
+            destination_id, _ = self.get_folder_info(destination_folder_name)
+            if not destination_id:
+                print("Cannot continue the move operation because the destination folder does not exist or is not accessible.")
+                return
 
-        # get the destination folder ID
-        folder_b_id, _ = self.get_folder_info(destination_folder_name)
-        if not folder_b_id:
-            print("Cannot continue the move operation because the destination folder does not exist or is not accessible.")
-            return
-            
-        print(f"Moved folder '{folder_to_move_name}' ID: {folder_a_id}")
-        print(f"Original Parent ID: {original_parent_id}")
-        print(f"Destination folder '{destination_folder_name}' ID: {folder_b_id}")
+            moves, sources = [], []
+            target_of = {}  # source folder ID -> target folder ID
+            for name, folders in self._find_folders(folder_names).items():
+                if not folders:
+                    print(f"Error：cannot found'{name}' folder。")
+                    continue
+                # the first folder is the target, its duplicates are emptied into it and deleted
+                target, *duplicates = folders
+                print(f"Found {len(folders)} folders named '{name}'. Target folder ID: {target['id']}")
+                for source in duplicates:
+                    target_of[source['id']] = target['id']
+                    sources.append(source)
+                if destination_id not in target.get('parents', []):
+                    moves.append({**target, 'target': destination_id})
+
+            # children of every duplicate, CHILDREN_QUERY OR-ed like in _list_subtree; while one page
+            # is being moved, the next one is already requested in the background
+            source_ids = list(target_of)
+            with ThreadPoolExecutor(max_workers=1) as prefetcher:
+                for start in range(0, len(source_ids), FOLDER_QUERY_CHUNK):
+                    chunk = source_ids[start:start + FOLDER_QUERY_CHUNK]
+                    response = self._list_children_page(chunk, None)
+                    while True:
+                        page_token = response.get('nextPageToken', None)
+                        next_page = None
+                        if page_token is not None:
+                            next_page = prefetcher.submit(self._list_children_page, chunk, page_token)
+
+                        for item in response.get('files', []):
+                            source_id = next(p for p in item.get('parents', []) if p in target_of)
+                            moves.append({**item, 'target': target_of[source_id]})
+                        self._move_items(moves)
+                        moves = []
+
+                        if next_page is None:
+                            break
+                        response = next_page.result()
+
+            self._move_items(moves)  # folder moves when there were no duplicates to list
+            self._delete_items(sources)
+            for name in folder_names:
+                self._forget_folder(name)
+            print("\n--- All duplicate folders have been merged and moved successfully! ---")
 
-        try:
-            print("The movement operation is being performed...")
-            self.service.files().update(
-                fileId=folder_a_id,
-                addParents=folder_b_id,
-                removeParents=original_parent_id,
-                fields='id, parents'  # fields which fileds the API should return
-            ).execute()
-            print("--- Operation successful! The folder has been moved. ---")
         except HttpError as error:
-            print(f"An error occurred when moving the folder: {error}")
+            print(f"An error occurred when performing the merge operation: {error}")
 
+    def _open_meta_db(self):
+        """Open the SQLite folder index (WAL mode, so concurrent runs can read while one writes)."""
+        db = sqlite3.connect(self.settings.GDRIVE_META_CACHE, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS folders ("
+            " lookup TEXT, name TEXT, parent TEXT, result TEXT, cached_at REAL,"
+            " PRIMARY KEY (lookup, name, parent))"
+        )
+        db.commit()
+        return db
+
+    def _cached_lookup(self, key, fetch):
+        """
+        Return the cached result for key, or call fetch() and remember its result.
+        Hits are kept for FOLDER_CACHE_TTL seconds, in memory and in the SQLite index
+        (so a rerun skips the lookup); misses (None / (None, None)) are only kept in
+        memory, for FOLDER_CACHE_NEGATIVE_TTL seconds.
+        """
+        now = time.monotonic()
+        lookup, name, parent = key
+        with self._folder_cache_lock:
+            entry = self._folder_cache.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+            row = self._meta_db.execute(
+                "SELECT result FROM folders WHERE lookup=? AND name=? AND parent=? AND cached_at>?",
+                (lookup, name, parent or '', time.time() - self.settings.FOLDER_CACHE_TTL)
+            ).fetchone()
+            if row is not None:
+                result = json.loads(row[0])
+                result = tuple(result) if isinstance(result, list) else result
+                self._folder_cache[key] = (now + self.settings.FOLDER_CACHE_TTL, result)
+                return result
+
+        result = fetch()
+        found = result[0] if isinstance(result, tuple) else result
+        ttl = self.settings.FOLDER_CACHE_TTL if found else self.settings.FOLDER_CACHE_NEGATIVE_TTL
+        with self._folder_cache_lock:
+            self._folder_cache[key] = (now + ttl, result)
+            if found:
+                self._meta_db.execute(
+                    "INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?)",
+                    (lookup, name, parent or '', json.dumps(result), time.time())
+                )
+                self._meta_db.commit()
+        return result
+
+    def _forget_folder(self, folder_name):
+        """Drop every cached lookup for folder_name (after it was moved, merged or deleted)."""
+        with self._folder_cache_lock:
+            for key in [key for key in self._folder_cache if key[1] == folder_name]:
+                del self._folder_cache[key]
+            self._meta_db.execute("DELETE FROM folders WHERE name=?", (folder_name,))
+            self._meta_db.commit()
 
     def get_folder_info(self, folder_name):
         try:
-            query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
-            fields = "files(id, name, parents)"
-            results = self.service.files().list(q=query, fields=fields, spaces='drive').execute()
-            items = results.get('files', [])
-            
-            if not items:
-                print(f"Error：cannot found'{folder_name}' folder。")
-                return None, None
-            
-            if len(items) > 1:
-                print(f"Warining：found multiple '{folder_name}' folder. will use the first one found.")
-                
-            folder_id = items[0]['id']
-            parent_id = items[0].get('parents', [None])[0]
-            return folder_id, parent_id
-
+            return self._cached_lookup(('info', folder_name, None), lambda: self._query_folder_info(folder_name))
         except HttpError as error:
             print(f"A error {error} occur when found'{folder_name}' folder.")
             return None, None
+
+    def _query_folder_info(self, folder_name):
+        query = FOLDER_BY_NAME_QUERY.format(name=_escape_query(folder_name))
+        fields = "files(id, parents)"
+        # two results are enough to tell a unique folder from duplicates
+        results = self._execute(self._files.list(q=query, fields=fields, spaces='drive', pageSize=2))
+        items = results.get('files', [])
+        
+        if not items:
+            print(f"Error：cannot found'{folder_name}' folder。")
+            return None, None
+        
+        if len(items) > 1:
+            print(f"Warining：found multiple '{folder_name}' folder. will use the first one found.")
+            
+        folder_id = items[0]['id']
+        parent_id = items[0].get('parents', [None])[0]
+        return folder_id, parent_id
         
 
     def get_gdrive_folder_id(self,folder_name, parent_id=None):
         """get the ID of a Google Drive folder by its name"""
-        query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}'"
+        query = FOLDER_BY_NAME_QUERY.format(name=_escape_query(folder_name))
         if parent_id:
-            query += f" and '{parent_id}' in parents"
-        
-        try:
-            results =self.service.files().list(q=query, fields="files(id)").execute()
+            query += " and " + CHILDREN_QUERY.format(parent_id=parent_id)
+
+        def fetch():
+            results = self._execute(self._files.list(q=query, fields="files(id)", pageSize=1))
             items = results.get('files', [])
             return items[0]['id'] if items else None
+
+        try:
+            return self._cached_lookup(('id', folder_name, parent_id), fetch)
         except HttpError as error:
             print(f"A error {error} occur when found'{folder_name}' folder.")
             return None
 
 
-    def download_folder_recursively(self,folder_id, local_path):
-        if not os.path.exists(local_path):
-            os.makedirs(local_path)
+    def _build_service(self):
+        """
+        Build a Drive v3 service on the shared credentials from the discovery document
+        bundled with google-api-python-client (no discovery fetch over the network).
+        Each service owns one keep-alive httplib2 connection with a socket timeout, so
+        consecutive calls from the same thread reuse the TLS session.
+        """
+        http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=self.settings.DRIVE_HTTP_TIMEOUT))
+        return build('drive', 'v3', http=http, static_discovery=True, cache_discovery=False)
+
+    @property
+    def _files(self):
+        """files() resource of the calling thread's service, built once per thread and reused."""
+        files = getattr(self._local, 'files', None)
+        if files is None:
+            files = self._thread_service().files()
+            self._local.files = files
+        return files
+
+    def _thread_service(self):
+        """Return a Drive service owned by the calling thread (httplib2 connections are not thread-safe)."""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._build_service()
+            self._local.service = service
+        return service
 
-        query = f"'{folder_id}' in parents"
-        results = self.service.files().list(q=query, fields="files(id, name, mimeType)").execute()
-        items = results.get('files', [])
+    def _thread_session(self):
+        """Return an authorized requests session owned by the calling thread."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = AuthorizedSession(self.creds)
+            self._local.session = session
+        return session
 
-        for item in items:
-            item_name = item['name']
-            item_id = item['id']
-            item_path = os.path.join(local_path, item_name)
+    def _download_file(self, item):
+        """
+        Download a single Drive file to item['path'] with one streamed GET.
+        Files above DOWNLOAD_STREAM_MAX_BYTES, and streams that fail, go through the
+        resumable chunked downloader instead.
+        The data goes to '<path>.part' and replaces item['path'] once complete, so an existing
+        file (possibly hard-linked into the raster cache) is never truncated or left half-written.
+        """
+        # bound the number of simultaneously open sockets/files (see open_file_limit)
+        with self._fd_semaphore:
+            try:
+                if int(item.get('size', 0)) <= self.settings.DOWNLOAD_STREAM_MAX_BYTES:
+                    try:
+                        url = DRIVE_MEDIA_URL.format(file_id=item['id'])
+                        with self._thread_session().get(url, stream=True) as response:
+                            response.raise_for_status()
+                            # copy the socket stream into the file in 1 MB blocks; iter_content (unlike
+                            # response.raw) wraps mid-stream urllib3 errors in RequestException
+                            with open(f"{item['path']}.part", 'wb') as fh:
+                                for block in response.iter_content(chunk_size=1 << 20):
+                                    fh.write(block)
+                        os.replace(f"{item['path']}.part", item['path'])
+                        print(f"  Download finished: {item['path']}")
+                        return
+                    except RequestException as error:
+                        print(f"  Streamed download of {item['path']} failed ({error}), retrying in chunks...")
+                self._download_file_chunked(item)
+            except BaseException:
+                # do not leave a partial file behind when the download gives up
+                if os.path.exists(f"{item['path']}.part"):
+                    os.remove(f"{item['path']}.part")
+                raise
 
-            if item['mimeType'] == 'application/vnd.google-apps.folder':
-                print(f"Enter the subfolder: {item_path}")
-                self.download_folder_recursively(item_id, item_path)
-            else:
+    def _download_file_chunked(self, item):
+        """Download a single Drive file to item['path'] (via '<path>.part') in ranged chunks using the calling thread's service."""
+        request = self._thread_service().files().get_media(fileId=item['id'])
+        with io.FileIO(f"{item['path']}.part", 'wb') as fh:
+            downloader = MediaIoBaseDownload(fh, request, chunksize=self.settings.DOWNLOAD_CHUNK_SIZE)
+            done = False
+            while not done:
+                # num_retries makes the client back off exponentially on 429/5xx responses
+                status, done = downloader.next_chunk(num_retries=self.settings.DOWNLOAD_RETRIES)
+        os.replace(f"{item['path']}.part", item['path'])
+        print(f"  Download finished: {item['path']}")
+
+    def _list_subtree(self, root_ids, local_path):
+        """
+        List every file below the root folders one folder layer at a time, OR-ing up to
+        FOLDER_QUERY_CHUNK parent IDs into a single files.list query, and mirror
+        the folder tree under local_path (all roots map onto local_path itself).
+        A file whose local path is already taken by a same-named file of another root (duplicate
+        folders) is saved as '<Drive folder id>_<name>' instead of overwriting it.
+        :return: list of {'id', 'path', 'size'} dicts, one per file to download
+        """
+        folder_paths = {root_id: local_path for root_id in root_ids}
+        files_to_download = []
+        file_paths = set()
+        frontier = list(root_ids)
+        os.makedirs(local_path, exist_ok=True)
+
+        while frontier:
+            next_frontier = []
+            for start in range(0, len(frontier), FOLDER_QUERY_CHUNK):
+                chunk = frontier[start:start + FOLDER_QUERY_CHUNK]
+                query = " or ".join(CHILDREN_QUERY.format(parent_id=fid) for fid in chunk)
+                page_token = None
+                while True:
+                    response = self._execute(self._files.list(
+                        q=query,
+                        fields="nextPageToken, files(id, name, mimeType, parents, size)",
+                        pageSize=1000,
+                        pageToken=page_token
+                    ))
+
+                    for item in response.get('files', []):
+                        parent_id = next(p for p in item.get('parents', []) if p in folder_paths)
+                        item_path = os.path.join(folder_paths[parent_id], item['name'])
+
+                        if item['mimeType'] == 'application/vnd.google-apps.folder':
+                            print(f"Enter the subfolder: {item_path}")
+                            os.makedirs(item_path, exist_ok=True)
+                            folder_paths[item['id']] = item_path
+                            next_frontier.append(item['id'])
+                        else:
+                            if item_path in file_paths:
+                                item_path = os.path.join(folder_paths[parent_id], f"{parent_id}_{item['name']}")
+                            file_paths.add(item_path)
+                            print(f"Ready to download: {item_path}")
+                            files_to_download.append({'id': item['id'], 'path': item_path, 'size': item.get('size', 0)})
+
+                    page_token = response.get('nextPageToken', None)
+                    if page_token is None:
+                        break
+            frontier = next_frontier
+
+        return files_to_download
+
+    def _download_files(self, files_to_download, skip_paths=()):
+        """
+        Fetch {'id', 'path', 'size'} items concurrently with the configured DOWNLOAD_BACKEND.
+        Items whose path is in skip_paths (e.g. rasters already restored from the local cache) are not fetched.
+        """
+        skip_paths = {os.path.normpath(path) for path in skip_paths}
+        files_to_download = [item for item in files_to_download if os.path.normpath(item['path']) not in skip_paths]
+        if files_to_download and self.settings.DOWNLOAD_BACKEND == 'asyncio':
+            from drive_async import download_files
+            download_files(self.creds, files_to_download,
+                           self.settings.DOWNLOAD_ASYNC_CONCURRENCY, self.settings.DRIVE_MAX_ATTEMPTS)
+        elif files_to_download:
+            with ThreadPoolExecutor(max_workers=self.settings.DOWNLOAD_PARALLELISM) as executor:
+                list(executor.map(self._download_file, files_to_download))
+
+    def download_folder_recursively(self,folder_id, local_path, skip_paths=()):
+        # Enumerate the whole tree first so every file, whatever its folder, shares one download pool
+        self._download_files(self._list_subtree([folder_id], local_path), skip_paths)
+
+    def download_folder_files(self, folder_id, local_path):
+        """Download only the files directly inside folder_id (no sub-folders) into local_path."""
+        os.makedirs(local_path, exist_ok=True)
+        files_to_download = []
+        page_token = None
+        while True:
+            response = self._execute(self._files.list(
+                q=CHILDREN_QUERY.format(parent_id=folder_id)
+                  + " and mimeType!='application/vnd.google-apps.folder' and trashed=false",
+                fields="nextPageToken, files(id, name, size)",
+                spaces='drive',
+                pageSize=1000,
+                pageToken=page_token
+            ))
+            for item in response.get('files', []):
+                item_path = os.path.join(local_path, item['name'])
                 print(f"Ready to download: {item_path}")
-                request = self.service.files().get_media(fileId=item_id)
-                with io.FileIO(item_path, 'wb') as fh:
-                    downloader = MediaIoBaseDownload(fh, request)
-                    done = False
-                    while not done:
-                        status, done = downloader.next_chunk()
-                        print(f"  Download progress: {int(status.progress() * 100)}%")
-                print(f"  Download finished: {item_name}")
-        
-    
\ No newline at end of file
+                files_to_download.append({'id': item['id'], 'path': item_path, 'size': item.get('size', 0)})
+            page_token = response.get('nextPageToken', None)
+            if page_token is None:
+                break
+        self._download_files(files_to_download)
+
+    def download_many_duplicate_folders(self, folder_names, base_path, skip_paths=()):
+        """
+        Download the contents of every (possibly duplicated) folder named in folder_names without
+        merging them on Drive first: the per-name listings run concurrently (HUC_PARALLELISM threads)
+        and all files then share one download pool. With DELETE_DRIVE_AFTER_DOWNLOAD, the Drive
+        folders of every name whose files all arrived are then deleted in batch requests.
+        :param folder_names: Folder names to download, one local sub-folder each
+        :param base_path: Local directory receiving <base_path>/<folder_name>
+        :param skip_paths: Local file paths that are already in place and are not downloaded again
+        """
+        folder_names = list(folder_names)
+        with ThreadPoolExecutor(max_workers=self.settings.HUC_PARALLELISM) as executor:
+            listings = list(executor.map(
+                lambda name: self._list_duplicate_folders(name, os.path.join(base_path, name)), folder_names
+            ))
+        self._download_files([item for _, files in listings for item in files], skip_paths)
+
+        if not self.settings.DELETE_DRIVE_AFTER_DOWNLOAD:
+            return
+        skip_paths = {os.path.normpath(path) for path in skip_paths}
+        verified = []
+        for name, (folders, files) in zip(folder_names, listings):
+            if all(self._is_downloaded(item, skip_paths) for item in files):
+                verified += folders
+            elif folders:
+                print(f"Keeping the Drive folder(s) named '{name}': not every file was downloaded.")
+        self._delete_items(verified)
+        for name in folder_names:
+            self._forget_folder(name)
+
+    def _is_downloaded(self, item, skip_paths):
+        """True if the {'id', 'path', 'size'} item is on disk (with the Drive size, unless it was skipped)."""
+        path = os.path.normpath(item['path'])
+        if not os.path.exists(path):
+            return False
+        return path in skip_paths or not item.get('size') or os.path.getsize(path) == int(item['size'])
+
+    def _list_duplicate_folders(self, folder_name, local_path):
+        """
+        List the files below every folder named folder_name, mirrored under local_path.
+        :return: (folders, files): the Drive folders ({'id', 'name'}) and the {'id', 'path', 'size'} files
+        """
+        query = FOLDER_BY_NAME_QUERY.format(name=_escape_query(folder_name))
+        try:
+            results = self._execute(self._files.list(q=query, fields="files(id, name)", spaces='drive', pageSize=1000))
+        except HttpError as error:
+            print(f"A error {error} occur when found'{folder_name}' folder.")
+            return [], []
+
+        folders = results.get('files', [])
+        if not folders:
+            print(f"Error：cannot found'{folder_name}' folder。")
+            return [], []
+        print(f"Downloading {len(folders)} folder(s) named '{folder_name}' to {local_path}")
+        return folders, self._list_subtree([folder['id'] for folder in folders], local_path)
@@ -1,13 +1,56 @@
 import ee
-import re
 import os
-import config as const
+import io
+import json
+import string
+import math
 import time
+import threading
+import numpy as np
+import rasterio
+from rasterio.io import MemoryFile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
 from drive_manager import GoogleDriveManager
+from cache_manager import RasterCache, MetadataCache
 from config import Settings
 import tools
 
-import time
+# Band layout of the stacked patch image (and of every fetched patch GeoTIFF), per modality
+PATCH_BANDS = {
+    'dem': ['elevation'],
+    'opt': ['SR_B4', 'SR_B3', 'SR_B2'],
+    'the': ['ST_B10'],
+    'sar': ['VV'],
+    'flow': ['dir'],
+}
+PATCH_BAND_IDS = [band for bands in PATCH_BANDS.values() for band in bands]
+# Bands stored as integer counts of a unit: physical value = stored value * scale. Thermal is kept in
+# deci-Kelvin in both the full-HUC export (uint16) and the patches, so the two always share units
+PATCH_BAND_SCALES = {'ST_B10': 0.1}
+
+# ASCII characters that are not allowed in export file names map to '_'
+# (non-ASCII characters are first encoded to '?', so they map to '_' too)
+_SAFE_NAME_CHARS = set(string.ascii_letters + string.digits + '_.-')
+_FILENAME_TABLE = str.maketrans({chr(i): '_' for i in range(128) if chr(i) not in _SAFE_NAME_CHARS})
+
+# source collections of the Landsat and SAR composites
+LANDSAT_COLLECTIONS = ('LANDSAT/LC09/C02/T1_L2', 'LANDSAT/LC08/C02/T1_L2')
+SAR_COLLECTION = 'COPERNICUS/S1_GRD'
+
+# bump when the cached patch-center layout or units change, so older cache entries are not reused
+PATCH_CENTERS_CACHE_VERSION = 2
+
+# uint8 codes of GEE task states; everything below TASK_COMPLETED is still pending
+TASK_COMPLETED, TASK_FAILED, TASK_DONE = 2, 3, 4  # TASK_DONE: cancelled or never started
+TASK_STATE_CODES = {
+    'UNSUBMITTED': 0,
+    'READY': 0,
+    'RUNNING': 1,
+    'COMPLETED': TASK_COMPLETED,
+    'FAILED': TASK_FAILED,
+}
 
 class GEEWorkflow:
     
@@ -15,12 +58,17 @@ class GEEWorkflow:
         
         self.settings = settings
         self.all_tasks = []
+        self._lock = threading.Lock()  # guards all_tasks / base_file_name / map output across HUC threads
         self.drive_manager = drive_manager
+        self._task_starter = None  # executor starting tasks while launch_all_export_tasks runs
+        self._task_starts = []  # futures of those start() calls
+        self.raster_cache = RasterCache(settings)
+        self.metadata_cache = MetadataCache(settings)
         self._authenticate()
         self._data_loader()
         
-        self.current_file = None
         self.base_file_name = []  # save base file name for each HUC export
+        self._restored_rasters = []  # local paths of rasters restored from the cache (not downloaded again)
         
         
     def _authenticate(self):
@@ -41,105 +89,178 @@ class GEEWorkflow:
         self.HUC8_COL = ee.FeatureCollection(self.settings.HUC8_COL_NAME)
         self.MERIT_HYDRO_IMG = ee.Image(self.settings.MERIT_HYDRO_IMG_NAME)
         self.DEM_SOURCE_IMG = ee.Image(self.settings.DEM_SOURCE_IMG_NAME)
+        # date-filtered base collections, built once and only filtered by bounds per HUC
+        self._landsat_base = ee.ImageCollection(LANDSAT_COLLECTIONS[0]) \
+            .merge(ee.ImageCollection(LANDSAT_COLLECTIONS[1])) \
+            .filterDate(self.settings.START_DATE, self.settings.END_DATE) \
+            .filter(ee.Filter.lt('CLOUD_COVER', self.settings.MAX_CLOUD_COVER)) \
+            .map(self._mask_l8sr_clouds)
+        self._sar_base = ee.ImageCollection(SAR_COLLECTION) \
+            .filterDate(self.settings.START_DATE, self.settings.END_DATE) \
+            .filter(ee.Filter.listContains('transmitterReceiverPolarisation', 'VV')) \
+            .filter(ee.Filter.eq('instrumentMode', 'IW')).select('VV')
+
+        # export parameters of each full-HUC raster, part of its raster cache key (dates are keyed separately);
+        # keep in sync with the exports in launch_single_data_collector
+        export = {'crs': self.settings.TARGET_DEM_CRS, 'scale': 10,
+                  'buffer_m': self.settings.BUFFER_DISTANCE_METERS}
+        landsat = {**export, 'source': LANDSAT_COLLECTIONS, 'cloud_mask_bits': [3, 4],
+                   'max_cloud_cover': self.settings.MAX_CLOUD_COVER}
+        self._raster_configs = {
+            'DEM': {**export, 'source': self.settings.DEM_SOURCE_IMG_NAME, 'dtype': 'float32'},
+            'Landsat_Optical': {**landsat, 'bands': PATCH_BANDS['opt'], 'dtype': 'float32'},
+            'Landsat_Thermal_dK': {**landsat, 'bands': PATCH_BANDS['the'], 'dtype': 'uint16_dK'},
+            'SAR_VV': {**export, 'source': SAR_COLLECTION, 'polarisation': 'VV', 'instrumentMode': 'IW',
+                       'dtype': 'float32'},
+            'FlowDir': {**export, 'source': self.settings.MERIT_HYDRO_IMG_NAME, 'bands': PATCH_BANDS['flow'],
+                        'dtype': 'uint8'},
+        }
     
     def launch_all_export_tasks(self):
         """Launch all export tasks for selected HUCs"""
         """Test function to randomly select HUCs and export their data"""
 
-        selected_hucs = self.HUC8_COL.randomColumn('random').sort('random').limit(self.settings.NUMBER_OF_HUCS)
-        
-        # 1. export original HUC boundaries to Google Drive
-        desc_global = f'ALL_HUC8_Original_Boundaries_Export_{self.settings.NUMBER_OF_HUCS}'
-        task_global = ee.batch.Export.table.toDrive(
-            collection=selected_hucs,
-            description=desc_global,
-            folder=self.settings.DRIVE_FOLDER,
-            fileNamePrefix=f'Selected_{self.settings.NUMBER_OF_HUCS}_HUC8_Original_Boundaries',
-            fileFormat=self.settings.EXPORT_VECTOR_FORMAT
-        )
-        self.all_tasks.append({'task': task_global, 'description': desc_global})
-
-        selected_hucs_list_info = selected_hucs.select(['huc8', 'states', 'name']).toList(self.settings.NUMBER_OF_HUCS).getInfo()
-        print(f"Obtain {len(selected_hucs_list_info)} information of one HUC. Start creating export tasks for each HUC...")
-
-        # 2. add tasks for each selected HUC
-        for feature_info in selected_hucs_list_info:
-            self.launch_single_data_collector(feature_info,self.settings.PATCH)
-            
-        # 3. launch the global HUC boundary export task
-        print(f"\n--- {len(self.all_tasks)}tasks have been created, started... ---")
-        for item in self.all_tasks:
-            item['task'].start()
-            print(f"Initiated task: {item['description']} (ID: {item['task'].id})")
+        selected_hucs = self.HUC8_COL.randomColumn('random', seed=self.settings.RANDOM_SEED).sort('random').limit(self.settings.NUMBER_OF_HUCS)
+
+        # Every task is started as soon as it is created (see _add_task), so the first exports
+        # already run on GEE while later HUCs are still being prepared; leaving the block waits
+        # for the remaining start() calls
+        with ThreadPoolExecutor(max_workers=self.settings.GEE_PARALLELISM) as self._task_starter:
+            # the selection is deterministic for a given seed, so reruns reuse the cached metadata
+            selected_hucs_list_info = self.metadata_cache.get_or_fetch(
+                ('selected_hucs', self.settings.HUC8_COL_NAME, self.settings.NUMBER_OF_HUCS, self.settings.RANDOM_SEED),
+                lambda: selected_hucs.select(['huc8', 'states', 'name']).toList(self.settings.NUMBER_OF_HUCS).getInfo()
+            )
+            print(f"Obtain {len(selected_hucs_list_info)} information of one HUC. Start creating export tasks for each HUC...")
+
+            # 1. export original HUC boundaries to Google Drive; the HUCs are picked by id, so the
+            # export does not evaluate the randomColumn/sort over the whole collection again
+            selected_ids = [info['properties']['huc8'] for info in selected_hucs_list_info]
+            desc_global = f'ALL_HUC8_Original_Boundaries_Export_{self.settings.NUMBER_OF_HUCS}'
+            task_global = ee.batch.Export.table.toDrive(
+                collection=self.HUC8_COL.filter(ee.Filter.inList('huc8', selected_ids)),
+                description=desc_global,
+                folder=self.settings.DRIVE_FOLDER,
+                fileNamePrefix=f'Selected_{self.settings.NUMBER_OF_HUCS}_HUC8_Original_Boundaries',
+                fileFormat=self.settings.EXPORT_VECTOR_FORMAT
+            )
+            self._add_task({'task': task_global, 'description': desc_global})
+
+            # 2. add tasks for each selected HUC; HUCs only wait on GEE round-trips, so build them concurrently
+            with ThreadPoolExecutor(max_workers=self.settings.GEE_PARALLELISM) as executor:
+                list(executor.map(lambda info: self.launch_single_data_collector(info, self.settings.PATCH),
+                                  selected_hucs_list_info))
+
+            print(f"\n--- {len(self.all_tasks)}tasks have been created, waiting for the last ones to start... ---")
+        self._task_starter = None
+        for future in self._task_starts:
+            future.result()  # re-raise a failed start()
+
+    def _start_task(self, item):
+        item['task'].start()
+        print(f"Initiated task: {item['description']} (ID: {item['task'].id})")
 
     def monitor_and_organize_tasks(self):
         """Monitor the status of all launched tasks and organize them in Google Drive"""
         print("\n---Monitor Mode ---")
-    
-        while True:
-            active_tasks = []
-            all_done = True
-            for item in self.all_tasks:
-                # only check tasks that are not already completed or failed
-                if item.get('state') != 'COMPLETED' and item.get('state') != 'FAILED':
-                    try:
-                        status = item['task'].status()
-                        current_state = status['state']
-                        item['state'] = current_state # update state in the item
-
-                        if current_state in ['RUNNING', 'READY']:
-                            active_tasks.append(item['description'])
-                            all_done = False 
-                        elif current_state == 'FAILED':
-                            print(f"!!! Task Failure: {item['description']} !!!")
-                            print(f"    Erro message: {status.get('error_message', 'Unknown error')}")
-
-                    except ee.ee_exception.EEException as e:
-                        # catch GEE-specific errors
-                        error_str = str(e)
-                        if '503' in error_str or 'unavailable' in error_str:
-                            # if it's a temporary server error, we can retry later
-                            print(f"Warning: Temory server error(503) occur when checking task'{item['description']}' status. Retrying later...")
-                            active_tasks.append(item['description']) # keep it in the active list
-                            all_done = False
-                        else:
-                            # for other errors, we mark the task as failed
-                            print(f"!!! Task Failed (Unknow GEE error): {item['description']} !!!")
-                            print(f"Error Message: {e}")
-                            item['state'] = 'FAILED'
-            
-            if all_done:
-                print("ALL Task FINISHED!")
+
+        # Task bookkeeping as parallel arrays (ids / descriptions / uint8 state codes), so selecting the
+        # pending or failed tasks of a cycle is a NumPy comparison instead of a scan over the task dicts
+        task_ids = [item['task'].id for item in self.all_tasks]
+        descriptions = [item['description'] for item in self.all_tasks]
+        states = np.array([
+            TASK_STATE_CODES.get(item.get('state', 'READY'), TASK_DONE) if task_id is not None else TASK_DONE  # never started
+            for item, task_id in zip(self.all_tasks, task_ids)
+        ], dtype=np.uint8)
+
+        # Poll every task with one listing call per cycle; finished tasks drop out of `pending`
+        pending = np.flatnonzero(states < TASK_COMPLETED)
+        unchanged_polls = 0
+        while pending.size:
+            try:
+                if pending.size <= self.settings.TASK_STATUS_BY_ID_MAX:
+                    # getTaskStatus is one GET per id, cheaper than listing the project's whole task history
+                    task_list = ee.data.getTaskStatus([task_ids[i] for i in pending])
+                else:
+                    task_list = ee.data.getTaskList()
+                statuses = {status['id']: status for status in task_list if status['state'] != 'UNKNOWN'}
+            except ee.ee_exception.EEException as e:
+                # catch GEE-specific errors
+                error_str = str(e)
+                if '503' in error_str or 'unavailable' in error_str:
+                    # if it's a temporary server error(503), keep every task and retry later
+                    print(f"Warning: Temory server error(503) occur when listing task status. Retrying later...")
+                    statuses = {}
+                else:
+                    # for other errors (auth, quota, project, ...), mark every pending task as failed
+                    print(f"!!! Task status check failed (Unknow GEE error) for {pending.size} task(s) !!!")
+                    print(f"Error Message: {e}")
+                    statuses = {task_ids[i]: {'id': task_ids[i], 'state': 'FAILED', 'error_message': error_str}
+                                for i in pending}
+
+            # tasks not listed (yet) keep their state and are checked again next cycle
+            listed = np.array([i for i in pending if task_ids[i] in statuses], dtype=np.intp)
+            new_states = np.array([TASK_STATE_CODES.get(statuses[task_ids[i]]['state'], TASK_DONE) for i in listed],
+                                  dtype=np.uint8)
+            changed = bool(np.any(new_states != states[listed]))
+
+            for i in listed[(new_states == TASK_FAILED) & (states[listed] != TASK_FAILED)]:
+                print(f"!!! Task Failure: {descriptions[i]} !!!")
+                print(f"    Erro message: {statuses[task_ids[i]].get('error_message', 'Unknown error')}")
+            for i in listed[new_states != states[listed]]:
+                self.all_tasks[i]['state'] = statuses[task_ids[i]]['state'] # update state in the item
+            states[listed] = new_states
+            pending = np.flatnonzero(states < TASK_COMPLETED)
+
+            if not pending.size:
                 break
-            
-            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Ongoing task: ({len(active_tasks)}/{len(self.all_tasks)}): {', '.join(active_tasks[:3])}...")
-            time.sleep(60) # check every 60 seconds
+
+            # back off while nothing changes (5s, 7.5s, ... up to 60s), poll quickly again after progress
+            unchanged_polls = 0 if changed else unchanged_polls + 1
+            delay = min(self.settings.TASK_POLL_MAX_INTERVAL,
+                        self.settings.TASK_POLL_MIN_INTERVAL * 1.5 ** unchanged_polls)
+            active_tasks = [descriptions[i] for i in pending[:3]]
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Ongoing task: ({pending.size}/{len(self.all_tasks)}): {', '.join(active_tasks)}...")
+            time.sleep(delay)
+
+        print("ALL Task FINISHED!")
         
         print("\n--- Get Data Patches ---")
 
         
-        # Because all tasks are parallel, multiple folders with the same name will appear in google drive and need to be merged.
-        print("\n--- Merging Google Drive folders ---")
-        for name in self.base_file_name:
-            print(f"Merging folders: {name}")
-            self.drive_manager.merge_duplicate_folders(name)
-            # move all files to the main folder
-            print(name)
-            self.drive_manager.move_folder(name, self.settings.DRIVE_FOLDER)
-            
-        print("\n--- Download files from Google Drive ---")
         if not os.path.exists(self.settings.LOCAL_DOWNLOAD_DIR):
             os.makedirs(self.settings.LOCAL_DOWNLOAD_DIR)
-        
-        
-        # get the main folder ID
-        main_folder_id = self.drive_manager.get_gdrive_folder_id(self.settings.DRIVE_FOLDER)
-        if not main_folder_id:
-            print(f"Error：Can not found main folder in Google Drive '{self.settings.DRIVE_FOLDER}'")
-            return
 
-        self.drive_manager.download_folder_recursively(main_folder_id, self.settings.LOCAL_DOWNLOAD_DIR)
-        
+        if not self.settings.MERGE_DRIVE_FOLDERS:
+            # Download each HUC's (duplicated) export folders directly; nothing is reorganized on Drive
+            print("\n--- Download files from Google Drive ---")
+            self.drive_manager.download_many_duplicate_folders(self.base_file_name, self.settings.LOCAL_DOWNLOAD_DIR,
+                                                               skip_paths=self._restored_rasters)
+            # the global boundaries export is written to DRIVE_FOLDER itself, not to a HUC folder
+            main_folder_id = self.drive_manager.get_gdrive_folder_id(self.settings.DRIVE_FOLDER, parent_id='root')
+            if main_folder_id:
+                self.drive_manager.download_folder_files(main_folder_id, self.settings.LOCAL_DOWNLOAD_DIR)
+            else:
+                print(f"Error：Can not found main folder in Google Drive '{self.settings.DRIVE_FOLDER}'")
+        else:
+            # Because all tasks are parallel, multiple folders with the same name will appear in google drive and need to be merged.
+            print("\n--- Merging Google Drive folders ---")
+
+            # every HUC's merge and move goes out in shared batch requests (up to 100 operations each)
+            self.drive_manager.merge_and_move_folders(self.base_file_name, self.settings.DRIVE_FOLDER)
+
+            print("\n--- Download files from Google Drive ---")
+            # get the main folder ID; GEE creates export folders in My Drive's root, so only look there
+            main_folder_id = self.drive_manager.get_gdrive_folder_id(self.settings.DRIVE_FOLDER, parent_id='root')
+            if not main_folder_id:
+                print(f"Error：Can not found main folder in Google Drive '{self.settings.DRIVE_FOLDER}'")
+                return
+
+            # DRIVE_FOLDER still holds the exports of earlier runs; rasters restored from the cache are not fetched again
+            self.drive_manager.download_folder_recursively(main_folder_id, self.settings.LOCAL_DOWNLOAD_DIR,
+                                                           skip_paths=self._restored_rasters)
+
+        self._cache_downloaded_rasters()
 
         return
         
@@ -156,145 +277,183 @@ class GEEWorkflow:
         original_geometry = ee.Geometry(feature_info['geometry'])
         
         # clean up name for file naming
-        clean_name = re.sub(r'[^a-zA-Z0-9_.-]', '_', name)
+        clean_name = name.encode('ascii', 'replace').decode('ascii').translate(_FILENAME_TABLE)
         base_filename = f'HUC8_{huc_id}_{clean_name}'
-        self.current_file = base_filename
-        self.base_file_name.append(base_filename)
+        with self._lock:
+            self.base_file_name.append(base_filename)
         
         
         buffered_geometry = original_geometry.buffer(self.settings.BUFFER_DISTANCE_METERS)
         export_region_rectangle = buffered_geometry.bounds()
+        # Images are clipped to a slightly larger rectangle: patches centered near the edge of the
+        # export region then still get real pixels (half a patch plus a 2 px resampling margin)
+        # instead of NoData. Full-HUC exports are still cut to export_region_rectangle by `region`.
+        # The margin uses the DEM pixel size (1/3 arc-second, ~10.3 m), not a rounded 10 m.
+        patch_margin_meters = ee.Number(self.settings.PATCH_SIZE // 2 + 2).multiply(
+            self.DEM_SOURCE_IMG.projection().nominalScale()
+        )
+        patch_region = export_region_rectangle.buffer(patch_margin_meters).bounds()
 
         print(f"\n Creat({name}) for HUC {huc_id}，export to {base_filename}")
 
-        # Task 0: export original HUC boundaries (vector)
-        desc_global = f'HUC8_Original_Boundaries_Export_{self.settings.NUMBER_OF_HUCS}'
-        task_global = ee.batch.Export.table.toDrive(
-            collection=ee.FeatureCollection([original_geometry]),
-            description=desc_global,
-            folder=base_filename,
-            fileNamePrefix=f'HUC8_{self.settings.NUMBER_OF_HUCS}_Original_Boundaries',
-            fileFormat=self.settings.EXPORT_VECTOR_FORMAT
-        )
-        self.all_tasks.append({'task': task_global, 'description': desc_global})
-        
-        
-        # Task 1: buffered boundary (vector)
-        buffered_fc = ee.FeatureCollection([ee.Feature(buffered_geometry, props)])
-        # print(buffered_fc.getInfo())
-        desc_buff = f'Buffered_Boundary_{huc_id}'
-        task_buff = ee.batch.Export.table.toDrive(
-            collection=buffered_fc, description=desc_buff, folder=base_filename,
-            fileNamePrefix=f'{base_filename}_Buffered_Boundary', fileFormat=self.settings.EXPORT_VECTOR_FORMAT
+        # Task 0-2: original boundary, buffered boundary and region rectangle (vector), as one
+        # collection tagged by 'type' so the three vectors cost a single export task
+        boundaries_fc = ee.FeatureCollection([
+            ee.Feature(original_geometry, {**props, 'type': 'original'}),
+            ee.Feature(buffered_geometry, {**props, 'type': 'buffered'}),
+            ee.Feature(export_region_rectangle, {**props, 'type': 'bbox'}),
+        ])
+        desc_bounds = f'Boundaries_{huc_id}'
+        task_bounds = ee.batch.Export.table.toDrive(
+            collection=boundaries_fc, description=desc_bounds, folder=base_filename,
+            fileNamePrefix=f'{base_filename}_Boundaries', fileFormat=self.settings.EXPORT_VECTOR_FORMAT
         )
-        self.all_tasks.append({'task': task_buff, 'description': desc_buff, 'folder': base_filename})
-
-        # Task 2: region rectangle (vector)
-        bbox_fc = ee.FeatureCollection([ee.Feature(export_region_rectangle, props)])
-        desc_bbox = f'BoundingBox_{huc_id}'
-        task_bbox = ee.batch.Export.table.toDrive(
-            collection=bbox_fc, description=desc_bbox, folder= base_filename,
-            fileNamePrefix=f'{base_filename}_BoundingBox', fileFormat=self.settings.EXPORT_VECTOR_FORMAT
-        )
-        self.all_tasks.append({'task': task_bbox, 'description': desc_bbox, 'folder': base_filename})
+        self._add_task({'task': task_bounds, 'description': desc_bounds, 'folder': base_filename})
         
         # Task 3: DEM
-        dem_image = self._get_dem(self.DEM_SOURCE_IMG,export_region_rectangle)
+        dem_image = self._get_dem(self.DEM_SOURCE_IMG,patch_region)
         # can be really time consuming
         
-        print(dem_image.projection().crs().getInfo())
-        
-        desc_dem = f'DEM_3DEP_Export_{huc_id}'
-        task_dem = ee.batch.Export.image.toDrive(
-            image=dem_image.toFloat(), description=desc_dem, folder=base_filename,
-            fileNamePrefix=f'{base_filename}_DEM_10m_Rect', region=export_region_rectangle,
-            scale=10, crs=self.settings.TARGET_DEM_CRS, maxPixels=1.5e10
-        )
-        self.all_tasks.append({'task': task_dem, 'description': desc_dem, 'folder': base_filename})
+        dem_prefix = f'{base_filename}_DEM_10m_Rect'
+        if not self._restore_cached_raster(huc_id, 'DEM', base_filename, dem_prefix):
+            desc_dem = f'DEM_3DEP_Export_{huc_id}'
+            task_dem = ee.batch.Export.image.toDrive(
+                image=dem_image.toFloat(), description=desc_dem, folder=base_filename,
+                fileNamePrefix=dem_prefix, region=export_region_rectangle,
+                scale=10, crs=self.settings.TARGET_DEM_CRS, maxPixels=1.5e10,
+                formatOptions={'cloudOptimized': True}  # tiled COG: windowed patch reads touch only a few blocks
+            )
+            self._add_task({'task': task_dem, 'description': desc_dem, 'folder': base_filename,
+                                   'cache_key': (huc_id, 'DEM'), 'file_prefix': dem_prefix})
 
         
         # Task 4 & 5: optical and thermal Landsat images
-        landsat_images = self._get_landsat_images(buffered_geometry, self.settings.START_DATE, self.settings.END_DATE)
-        landsat_images['optical'] = landsat_images['optical'].reproject(
-            crs='EPSG:4269',
-            scale = 10
-        ).clip(export_region_rectangle)
-        landsat_images['thermal']= landsat_images['thermal'].reproject(
-            crs='EPSG:4269',
-            scale = 10
-        ).clip(export_region_rectangle)
-        
-        
-        print(landsat_images['optical'].toFloat().projection().crs().getInfo()) 
-        print(landsat_images['thermal'].toFloat().projection().crs().getInfo())
-        
-        
-        desc_l_opt = f'Landsat_Optical_Export_{huc_id}'
-        task_l_opt = ee.batch.Export.image.toDrive(
-            image=landsat_images['optical'].toFloat(), description=desc_l_opt, folder=base_filename,
-            fileNamePrefix=f'{base_filename}_Landsat_Optical_Rect', region=export_region_rectangle,
-            scale=10, crs='EPSG:4326', maxPixels=1.5e10
-        )
-        self.all_tasks.append({'task': task_l_opt, 'description': desc_l_opt, 'folder': base_filename})
-        
-        desc_l_therm = f'Landsat_Thermal_Export_{huc_id}'
-        task_l_therm = ee.batch.Export.image.toDrive(
-            image=landsat_images['thermal'].toFloat(), description=desc_l_therm, folder=base_filename,
-            fileNamePrefix=f'{base_filename}_Landsat_Thermal_Rect', region=export_region_rectangle,
-            scale=10, crs='EPSG:4326', maxPixels=1.5e10
-        )
-        self.all_tasks.append({'task': task_l_therm, 'description': desc_l_therm, 'folder': base_filename})
+        # composites only get a default 10 m projection in TARGET_DEM_CRS; the export (or patch grid)
+        # then resamples each pixel once instead of reproject() followed by a second export reprojection
+        landsat_images = self._get_landsat_images(buffered_geometry)
+        landsat_images['optical'] = landsat_images['optical'].setDefaultProjection(
+            self.settings.TARGET_DEM_CRS, None, 10
+        ).clip(patch_region)
+        # thermal is quantized to deci-Kelvin (0.1 K steps, 270-340 K -> 2700-3400, see PATCH_BAND_SCALES)
+        # before the projection is set, so the Drive export and the patches share the units
+        landsat_images['thermal']= landsat_images['thermal'].multiply(10).round().setDefaultProjection(
+            self.settings.TARGET_DEM_CRS, None, 10
+        ).clip(patch_region)
+        
+        
+        l_opt_prefix = f'{base_filename}_Landsat_Optical_Rect'
+        if not self._restore_cached_raster(huc_id, 'Landsat_Optical', base_filename, l_opt_prefix):
+            desc_l_opt = f'Landsat_Optical_Export_{huc_id}'
+            task_l_opt = ee.batch.Export.image.toDrive(
+                image=landsat_images['optical'].toFloat(), description=desc_l_opt, folder=base_filename,
+                fileNamePrefix=l_opt_prefix, region=export_region_rectangle,
+                scale=10, crs=self.settings.TARGET_DEM_CRS, maxPixels=1.5e10,
+                formatOptions={'cloudOptimized': True}
+            )
+            self._add_task({'task': task_l_opt, 'description': desc_l_opt, 'folder': base_filename,
+                                   'cache_key': (huc_id, 'Landsat_Optical'), 'file_prefix': l_opt_prefix})
+        
+        l_therm_prefix = f'{base_filename}_Landsat_Thermal_Rect'
+        # deci-Kelvin thermal is exported as uint16, half the bytes of float32
+        if not self._restore_cached_raster(huc_id, 'Landsat_Thermal_dK', base_filename, l_therm_prefix):
+            desc_l_therm = f'Landsat_Thermal_Export_{huc_id}'
+            task_l_therm = ee.batch.Export.image.toDrive(
+                image=landsat_images['thermal'].toUint16(), description=desc_l_therm, folder=base_filename,
+                fileNamePrefix=l_therm_prefix, region=export_region_rectangle,
+                scale=10, crs=self.settings.TARGET_DEM_CRS, maxPixels=1.5e10,
+                formatOptions={'cloudOptimized': True}
+            )
+            self._add_task({'task': task_l_therm, 'description': desc_l_therm, 'folder': base_filename,
+                                   'cache_key': (huc_id, 'Landsat_Thermal_dK'), 'file_prefix': l_therm_prefix})
         
         # Task 6: SAR image
-        sar_image = self._get_sar_image(buffered_geometry, self.settings.START_DATE, self.settings.END_DATE)
+        sar_image = self._get_sar_image(buffered_geometry)
         # print(sar_image.projection().crs().getInfo())
-        sar_image = sar_image.reproject(
-            crs='EPSG:4269',
-            scale =10
-        ).clip(export_region_rectangle)
+        sar_image = sar_image.setDefaultProjection(
+            self.settings.TARGET_DEM_CRS, None, 10
+        ).clip(patch_region)
         
         
         
-        desc_sar = f'SAR_VV_Export_{huc_id}'
-        task_sar = ee.batch.Export.image.toDrive(
-            image=sar_image.toFloat(), description=desc_sar, folder=base_filename,
-            fileNamePrefix=f'{base_filename}_SAR_VV_Rect', region=export_region_rectangle,
-            scale=10, crs='EPSG:4269', maxPixels=1.5e10
-        )
-        self.all_tasks.append({'task': task_sar, 'description': desc_sar, 'folder': base_filename})
+        sar_prefix = f'{base_filename}_SAR_VV_Rect'
+        if not self._restore_cached_raster(huc_id, 'SAR_VV', base_filename, sar_prefix):
+            desc_sar = f'SAR_VV_Export_{huc_id}'
+            task_sar = ee.batch.Export.image.toDrive(
+                image=sar_image.toFloat(), description=desc_sar, folder=base_filename,
+                fileNamePrefix=sar_prefix, region=export_region_rectangle,
+                scale=10, crs=self.settings.TARGET_DEM_CRS, maxPixels=1.5e10,
+                formatOptions={'cloudOptimized': True}
+            )
+            self._add_task({'task': task_sar, 'description': desc_sar, 'folder': base_filename,
+                                   'cache_key': (huc_id, 'SAR_VV'), 'file_prefix': sar_prefix})
 
         # Task 7: MERIT Hydro Flow Direction
-        flow_dir_resampled = self.MERIT_HYDRO_IMG.select('dir').reproject(crs=self.settings.TARGET_DEM_CRS, scale=10)
-        flow_dir_final = flow_dir_resampled.clip(export_region_rectangle)
-
-        flow_dir_final = flow_dir_final.reproject(
-            crs = self.settings.TARGET_DEM_CRS,
-            scale = 10
-        )
-        
-        print(flow_dir_final.projection().crs().getInfo())
-        
-        desc_flow = f'FlowDir_10m_Export_{huc_id}'
-        task_flow = ee.batch.Export.image.toDrive(
-            image=flow_dir_final.toUint8(), description=desc_flow, folder=base_filename,
-            fileNamePrefix=f'{base_filename}_FlowDir_10m_Rect', region=export_region_rectangle,
-            scale=10, crs='EPSG:4326', maxPixels=1.5e10
-        )
-        self.all_tasks.append({'task': task_flow, 'description': desc_flow, 'folder': base_filename})
+        flow_dir_final = self.MERIT_HYDRO_IMG.select('dir').setDefaultProjection(
+            self.settings.TARGET_DEM_CRS, None, 10
+        ).clip(patch_region)
+        
+        if self.settings.DEBUG:
+            # one round-trip for all projections instead of one getInfo() per image
+            print(ee.Dictionary({
+                'dem': dem_image.projection().crs(),
+                'optical': landsat_images['optical'].projection().crs(),
+                'thermal': landsat_images['thermal'].projection().crs(),
+                'flow': flow_dir_final.projection().crs(),
+            }).getInfo())
+        
+        flow_prefix = f'{base_filename}_FlowDir_10m_Rect'
+        if not self._restore_cached_raster(huc_id, 'FlowDir', base_filename, flow_prefix):
+            desc_flow = f'FlowDir_10m_Export_{huc_id}'
+            task_flow = ee.batch.Export.image.toDrive(
+                image=flow_dir_final.toUint8(), description=desc_flow, folder=base_filename,
+                fileNamePrefix=flow_prefix, region=export_region_rectangle,
+                scale=10, crs=self.settings.TARGET_DEM_CRS, maxPixels=1.5e10,
+                formatOptions={'cloudOptimized': True}
+            )
+            self._add_task({'task': task_flow, 'description': desc_flow, 'folder': base_filename,
+                                   'cache_key': (huc_id, 'FlowDir'), 'file_prefix': flow_prefix})
         
         print(f"\n--- Get Data Patches ---")
         # 1. Generate patch centers
         
-        patch_centers = self._genearte_patch_centers(dem_image, self.settings.PATCH_SIZE, self.settings.PATCH_STRIDE,buffered_geometry)
-        # print(type(patch_centers))
-        print(f"Patch centers generated. Total centers: {patch_centers.size().getInfo()}")
+        batch_size = self.settings.BATCH_EXPORT_SIZE
+
+        def generate_centers():
+            patch_centers = self._genearte_patch_centers(dem_image, self.settings.PATCH_SIZE, self.settings.PATCH_STRIDE,buffered_geometry)
+            # every patch is cut on the DEM pixel grid. One getInfo() returns that grid
+            # ({'crs': ..., 'transform': [a, b, c, d, e, f]}) and every center as [x, y] in it, so the
+            # batches below are plain list slices instead of slices of a server-side toList().
+            # Centers are transformed to the bare CRS (no affine), i.e. CRS coordinates, not pixel indices
+            dem_projection = dem_image.projection()
+            return ee.Dictionary({
+                'grid': dem_projection,
+                'scale': dem_projection.nominalScale(),
+                'centers': patch_centers.map(
+                    lambda feature: ee.Feature(None, {'xy': feature.geometry().transform(dem_projection.crs(), 1).coordinates()})
+                ).aggregate_array('xy'),
+            }).getInfo()
+
+        # the centers only depend on the HUC, the buffer and the patch grid, so reruns read them from disk;
+        # an empty center list is never stored, so a failed grid does not stick for METADATA_CACHE_TTL
+        grid_info = self.metadata_cache.get_or_fetch(
+            ('patch_centers', PATCH_CENTERS_CACHE_VERSION, huc_id, self.settings.DEM_SOURCE_IMG_NAME,
+             self.settings.BUFFER_DISTANCE_METERS, self.settings.PATCH_SIZE, self.settings.PATCH_STRIDE),
+            generate_centers,
+            cacheable=lambda info: bool(info['centers'])
+        )
+        dem_grid, all_centers = grid_info['grid'], grid_info['centers']
+        num_centers = len(all_centers)
+        dem_scale = grid_info['scale']  # meters per DEM pixel, reused by every batch
+        num_batches = math.ceil(num_centers / batch_size)
+        print(f"Patch centers generated. Total centers: {num_centers}")
         
         # 3. Visualization
         if self.settings.VISUALIZE_POINTS:
-            import tools
             # 3. Visualize patch centers
-            map= tools.plot_centers_ee(patch_centers, buffered_geometry)
-            map.to_html("visualization.html")
+            with self._lock:
+                patch_centers = ee.FeatureCollection([ee.Feature(ee.Geometry.Point(xy, dem_grid['crs'])) for xy in all_centers])
+                map= tools.plot_centers_ee(patch_centers, buffered_geometry)
+                map.to_html("visualization.html")
  
         
         # Get patches 
@@ -302,80 +461,219 @@ class GEEWorkflow:
            
         print(f"\nGet patches based on the center point by batch...")
         
-        batch_size = self.settings.BATCH_EXPORT_SIZE
-        num_batches = patch_centers.size().divide(batch_size).ceil().getInfo()
-        patch_centers_lists = patch_centers.toList(patch_centers.size())
-        
-        # test, 1 batches 
-        for i in range(1): # num_batches
-            print(f"Processing batch {i+1}/{num_batches}...")
-            start_index = i * batch_size
-            end_index = start_index + batch_size
-            
-            batch_patches = ee.FeatureCollection(patch_centers_lists.slice(start_index,end_index))
-            
-            dem_image_patches = self._extract_patches_gee(dem_image, batch_patches, self.settings.PATCH_SIZE)
-            opt_image_patches = self._extract_patches_gee(landsat_images['optical'],batch_patches,self.settings.PATCH_SIZE)
-            the_image_patches = self._extract_patches_gee(landsat_images['thermal'],batch_patches,self.settings.PATCH_SIZE)
-            sar_image_patches = self._extract_patches_gee(sar_image,batch_patches,self.settings.PATCH_SIZE)
-            flow_image_patches = self._extract_patches_gee(flow_dir_final,batch_patches,self.settings.PATCH_SIZE)
-            
-            
-            dem_image_patches = dem_image_patches.toList(dem_image_patches.size())
-            opt_image_patches = opt_image_patches.toList(opt_image_patches.size())
-            the_image_patches = the_image_patches.toList(the_image_patches.size())
-            sar_image_patches = sar_image_patches.toList(sar_image_patches.size())
-            flow_image_patches = flow_image_patches.toList(flow_image_patches.size())
+        # all modalities share the patch geometry, so stack them once and cut every patch from the stack.
+        # A GeoTIFF patch has one pixel type, so the stack is float32; the integer bands (deci-Kelvin thermal,
+        # flow direction codes) are exact in it and keep the units of the full-HUC exports
+        stacked_image = ee.Image.cat([dem_image, landsat_images['optical'], landsat_images['thermal'],
+                                      sar_image, flow_dir_final]).toFloat()
+        
+        # One fetch pool for the whole HUC: batch i+1 is prepared (and its requests queued) while the
+        # patches of batch i are still downloading and being written, instead of waiting per batch
+        patch_fetches = []
+        patch_metadata = {}  # patch index -> center and pixel grid, written next to the patches
+        fetch_counts = Counter()  # planned / completed / failed patch fetches of this HUC
+        counts_lock = threading.Lock()
+        progress = tqdm(total=0, desc=f'{huc_id} patches', unit='patch')
+
+        def on_fetch_done(future):
+            with counts_lock:
+                fetch_counts['failed' if future.exception() else 'completed'] += 1
+                progress.set_postfix(fetch_counts, refresh=False)
+                progress.update(1)
+
+        with ThreadPoolExecutor(max_workers=self.settings.PATCH_FETCH_PARALLELISM) as patch_fetcher:
+            # test, 1 batches 
+            for i in range(1): # num_batches
+                progress.set_description(f'{huc_id} patches (batch {i+1}/{num_batches})')
+                start_index = i * batch_size
+                end_index = start_index + batch_size
+                centers = all_centers[start_index:end_index]
             
-            
-            # image_list = image_patches.toList(image_patches.size())
-            collection_size = dem_image_patches.size().getInfo()
-
-            print(f"{collection_size} images is found, start exporting...")
-            
-            # counter = 0
-            # Export each image in the collection to Google Drive
-            # export 2 images for testing, to export all images, change the range to collection_size
-            print('Testing export patches...Only 1 images will be exported.')
-            for i in range(1):
-                self._save_patches(ee.Image(dem_image_patches.get(i)),i,'dem')
-                self._save_patches(ee.Image(opt_image_patches.get(i)),i,'opt')
-                self._save_patches(ee.Image(the_image_patches.get(i)),i,'the')
-                self._save_patches(ee.Image(sar_image_patches.get(i)),i,'sar')
-                self._save_patches(ee.Image(flow_image_patches.get(i)),i,'flow')
-                
-                # test
-                map = tools.plot_raster_patches_ee(ee.Image(dem_image_patches.get(i)),ee.Image(opt_image_patches.get(i))
-                                                   ,ee.Image(the_image_patches.get(i)),ee.Image(sar_image_patches.get(i))
-                                                   ,ee.Image(flow_image_patches.get(i)),boundary=buffered_geometry)
-                map.to_html("test.html")   
+                batch_patches = ee.FeatureCollection([ee.Feature(ee.Geometry.Point(xy, dem_grid['crs'])) for xy in centers])
+                stacked_patches = self._extract_patches_gee(stacked_image, batch_patches, self.settings.PATCH_SIZE, dem_scale)
+
+                # Fetch the pixels of each patch directly to local disk instead of one Drive export task per patch
+                # export 1 patch for testing, to export all patches, drop the slice below
+                tqdm.write('Testing export patches...Only 1 images will be exported.')
+                centers = centers[:1]
+                jobs = list(enumerate(centers, start=start_index))
+                if self.settings.SKIP_EMPTY_PATCHES:
+                    valid_jobs = self._valid_patch_jobs(stacked_image, jobs, dem_grid)
+                    with counts_lock:
+                        fetch_counts['skipped'] += len(jobs) - len(valid_jobs)
+                    jobs = valid_jobs
+                # one request per patch for all modalities; bands follow PATCH_BANDS
+                batch_fetches = self._fetch_patches(patch_fetcher, stacked_image, jobs, dem_grid, base_filename, 'stack')
+                patch_metadata.update(
+                    (str(index), {'center': center, 'grid': self._patch_grid(center, dem_grid)['affineTransform']})
+                    for index, center in jobs
+                )
+                with counts_lock:
+                    fetch_counts['planned'] += len(batch_fetches)
+                    progress.total += len(batch_fetches)
+                    progress.refresh()
+                for future in batch_fetches:
+                    future.add_done_callback(on_fetch_done)
+                patch_fetches += batch_fetches
+
+                for i in range(1):
+                    # test
+                    with self._lock:
+                        patch = ee.Image(stacked_patches.toList(1, i).get(0))
+                        map = tools.plot_raster_patches_ee(*(patch.select(bands) for bands in PATCH_BANDS.values()),
+                                                           boundary=buffered_geometry)
+                        map.to_html("test.html")   
+
+        progress.close()
+        tqdm.write(f"{base_filename} patch fetches: {dict(fetch_counts)}")
+        self._write_patch_metadata(base_filename, huc_id, dem_grid, patch_metadata, fetch_counts)
+        for future in patch_fetches:
+            future.result()  # re-raise a failed fetch
         
         return 
         # 
         # Task 8: Patches
 
         
-    def _save_patches(self,raster:ee.Image,index,name):
-        # image = 
-                
-        image_id = raster.id().getInfo()
-        file_name = f"patches_image_{name}_{image_id.replace('/', '_')}"
-        
-        # print(f"Creating image export task {counter+1}/{collection_size} (ID: {image_id})...")
-        # counter +=  1
-        
-        task = ee.batch.Export.image.toDrive(
-            image=raster, 
-            description=f'Export_Image_{index+1}',
-            folder=self.current_file,
-            fileNamePrefix=file_name,
-            scale=10,
-            crs='EPSG:4326', # TODO: dangrous
-            maxPixels=1e10
+    def _add_task(self, item):
+        """Record an export task and start it right away; safe to call from concurrent HUC collectors."""
+        with self._lock:
+            self.all_tasks.append(item)
+        if self._task_starter is not None:
+            self._task_starts.append(self._task_starter.submit(self._start_task, item))
+
+    def _restore_cached_raster(self, huc_id, modality, base_filename, file_prefix):
+        """
+        Put a cached raster where the download step would leave it.
+
+        Returns True on a cache hit, in which case the export task can be skipped.
+        """
+        destination = os.path.join(self.settings.LOCAL_DOWNLOAD_DIR, base_filename, f'{file_prefix}.tif')
+        if self.raster_cache.restore(huc_id, modality, self._raster_configs[modality], destination):
+            print(f"Cache hit: {modality} for HUC {huc_id}, skipping export.")
+            with self._lock:
+                self._restored_rasters.append(destination)
+            return True
+        return False
+
+    def _cache_downloaded_rasters(self):
+        """Register every downloaded full-HUC raster in the on-disk cache."""
+        for item in self.all_tasks:
+            if 'cache_key' not in item or item.get('state') != 'COMPLETED':
+                continue
+            path = os.path.join(self.settings.LOCAL_DOWNLOAD_DIR, item['folder'], f"{item['file_prefix']}.tif")
+            if os.path.exists(path):
+                huc_id, modality = item['cache_key']
+                self.raster_cache.register(huc_id, modality, self._raster_configs[modality], path)
+
+    def _patch_grid(self, center, dem_grid):
+        """
+        Pixel grid of the PATCH_SIZE x PATCH_SIZE window around `center` ([x, y] in the DEM CRS),
+        snapped to the DEM pixels, in the form expected by ee.data.computePixels.
+        """
+        a, b, c, d, e, f = dem_grid['transform']
+        half = self.settings.PATCH_SIZE // 2
+        col_off = math.floor((center[0] - c) / a) - half
+        row_off = math.floor((center[1] - f) / e) - half
+        return {
+            'dimensions': {'width': self.settings.PATCH_SIZE, 'height': self.settings.PATCH_SIZE},
+            'affineTransform': {
+                'scaleX': a, 'shearX': b, 'translateX': c + col_off * a,
+                'shearY': d, 'scaleY': e, 'translateY': f + row_off * e,
+            },
+            'crsCode': dem_grid['crs'],
+        }
+
+    def _valid_patch_jobs(self, image:ee.Image, jobs, dem_grid):
+        """
+        Drop the (index, center) jobs whose patch has no valid pixel in at least one modality
+        (e.g. fully clouded Landsat or outside the SAR swath), checked in one reduceRegions call.
+        """
+        footprints = []
+        for index, center in jobs:
+            grid = self._patch_grid(center, dem_grid)['affineTransform']
+            x0, y0 = grid['translateX'], grid['translateY']
+            x1 = x0 + self.settings.PATCH_SIZE * grid['scaleX']
+            y1 = y0 + self.settings.PATCH_SIZE * grid['scaleY']
+            footprints.append(ee.Feature(ee.Geometry.Rectangle([x0, y1, x1, y0], dem_grid['crs'], False), {'idx': index}))
+
+        # per modality: 1 where every band of the modality is unmasked
+        coverage = ee.Image.cat([
+            image.select(bands).mask().reduce(ee.Reducer.min()).rename(name) for name, bands in PATCH_BANDS.items()
+        ])
+        reduced = coverage.reduceRegions(
+            collection=ee.FeatureCollection(footprints), reducer=ee.Reducer.max(),
+            crs=dem_grid['crs'], crsTransform=dem_grid['transform']
         )
-        self.all_tasks.append({'task': task, 'description': f'Export_Image_{name}_{index+1}', 'folder': self.current_file})
+        valid = set(reduced.filter(ee.Filter.And(*[ee.Filter.gt(name, 0) for name in PATCH_BANDS]))
+                    .aggregate_array('idx').getInfo())
+        return [job for job in jobs if job[0] in valid]
 
-        return
+    def _fetch_patches(self, executor, image:ee.Image, jobs, dem_grid, folder, name):
+        """
+        Queue one ee.data.computePixels download per (index, center) job on executor, written to
+        LOCAL_DOWNLOAD_DIR/<folder>/patches/patches_image_<name>_<index>.tif, or .npy (H x W x bands,
+        bands in PATCH_BANDS order) when PATCH_FORMAT is 'NPY'.
+        Returns the futures, so the caller can keep preparing the next batch meanwhile.
+        """
+        out_dir = os.path.join(self.settings.LOCAL_DOWNLOAD_DIR, folder, 'patches')
+        os.makedirs(out_dir, exist_ok=True)
+
+        def fetch(job):
+            index, center = job
+            data = ee.data.computePixels({
+                'expression': image,
+                'fileFormat': self.settings.PATCH_FORMAT,
+                'bandIds': PATCH_BAND_IDS,
+                'grid': self._patch_grid(center, dem_grid),
+            })
+            path = os.path.join(out_dir, f'patches_image_{name}_{index}')
+            if self.settings.PATCH_FORMAT == 'NPY':
+                # 'NPY' comes back as raw .npy bytes holding a structured array (one field per band)
+                patch = np.load(io.BytesIO(data))
+                np.save(f'{path}.npy', np.stack([patch[band] for band in patch.dtype.names], axis=-1))
+            else:
+                self._write_patch(f'{path}.tif', data)
+
+        return [executor.submit(fetch, job) for job in jobs]
+    
+    def _write_patch_metadata(self, folder, huc_id, dem_grid, patches, fetch_counts):
+        """Write the patch layout of a HUC to LOCAL_DOWNLOAD_DIR/<folder>/patches/metadata.json."""
+        path = os.path.join(self.settings.LOCAL_DOWNLOAD_DIR, folder, 'patches', 'metadata.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        metadata = {
+            'huc8': huc_id,
+            'crs': dem_grid['crs'],
+            'patch_size': self.settings.PATCH_SIZE,
+            'format': self.settings.PATCH_FORMAT,
+            'bands': PATCH_BAND_IDS,
+            'dtype': 'float32',
+            'band_scales': {band: PATCH_BAND_SCALES.get(band, 1) for band in PATCH_BAND_IDS},
+            'fetch_counts': dict(fetch_counts),
+            'patches': patches,
+        }
+        with open(path, 'w') as fh:
+            json.dump(metadata, fh)
+
+    def _write_patch(self, path, data):
+        """
+        Re-encode a fetched GeoTIFF patch as a tiled, LZW-compressed GeoTIFF (one tile per patch,
+        floating-point predictor for float bands, horizontal differencing otherwise), pixel-interleaved
+        so a patch is read back as one contiguous H x W x bands block, with PATCH_BAND_IDS as band names
+        and PATCH_BAND_SCALES as band scales.
+        """
+        block = -(-self.settings.PATCH_SIZE // 16) * 16  # GeoTIFF tiles are multiples of 16
+        with MemoryFile(data) as memfile, memfile.open() as src:
+            profile = src.profile
+            profile.update(
+                driver='GTiff', tiled=True, blockxsize=block, blockysize=block, compress='lzw', interleave='pixel',
+                predictor=3 if np.issubdtype(np.dtype(src.dtypes[0]), np.floating) else 2,
+            )
+            with rasterio.open(path, 'w', **profile) as dst:
+                dst.write(src.read())
+                for band_index, band in enumerate(PATCH_BAND_IDS[:src.count], start=1):
+                    dst.set_band_description(band_index, band)
+                dst.scales = [PATCH_BAND_SCALES.get(band, 1) for band in PATCH_BAND_IDS[:src.count]]
     
     # def _get_patches(self, raster:ee.Image, patch_centers:ee.FeatureCollection, base_filename, data_type=None)->ee.FeatureCollection:
     #     """
@@ -460,32 +758,42 @@ class GEEWorkflow:
             ee.FeatureCollection: A collection of points representing the center of each patch.
         """
 
+        # The centers are the pixels whose row/column minus patch_size//2 is a multiple of stride.
+        # Instead of rasterizing that mask and vectorizing it (reduceToVectors is O(pixels)),
+        # compute the grid analytically from the projection and the bounds in one round-trip.
+        # The bounds are requested in the bare CRS (proj.crs(), no affine), so the ring is in CRS
+        # units and (coord - origin) / size below turns it into column/row indices of the DEM grid.
         proj = raster.projection()
-        # print(f"Projection: {proj.getInfo()}")
-        pixel_coords = ee.Image.pixelCoordinates(proj)
-        int_pixel_coords = pixel_coords.round() # inportant to round pixel coordinates to avoid floating point issues
-        
+        info = ee.Dictionary({'proj': proj, 'bounds': bounder.bounds(1, proj.crs()).coordinates()}).getInfo()
+        a, b, c, d, e, f = info['proj']['transform']
+        ring = info['bounds'][0]
         offset = patch_size // 2
-        y_mask = int_pixel_coords.select('y').subtract(offset).mod(stride).eq(0)
-        x_mask = int_pixel_coords.select('x').subtract(offset).mod(stride).eq(0)
-        center_pixel_mask = y_mask.And(x_mask)
-        
 
-        patch_centers = center_pixel_mask.selfMask().reduceToVectors(
-            geometry=bounder,#raster.geometry(),
-            scale=proj.nominalScale(),
-            geometryType='centroid',
-            eightConnected=False,
-            maxPixels=5e8  # c
-        )
+        def axis(coords, origin, size):
+            """First pixel-center coordinate and count of the centers along one axis."""
+            low, high = sorted(((min(coords) - origin) / size, (max(coords) - origin) / size))
+            first = offset + math.ceil((math.floor(low) - offset) / stride) * stride
+            count = (math.floor(high) - first) // stride + 1
+            return origin + (first + 0.5) * size, max(count, 0)
 
-        return patch_centers.select([])
+        x0, nx = axis([point[0] for point in ring], c, a)
+        y0, ny = axis([point[1] for point in ring], f, e)
+        if nx == 0 or ny == 0:
+            return ee.FeatureCollection([])
+
+        crs = info['proj']['crs']
+        xs = ee.List.sequence(x0, None, stride * a, nx)
+        centers = ee.List.sequence(y0, None, stride * e, ny).map(
+            lambda y: xs.map(lambda x: ee.Feature(ee.Geometry.Point([x, y], crs)))
+        ).flatten()
+
+        return ee.FeatureCollection(centers).filterBounds(bounder)
 
 
     # def _filter_patch_centers(self,centers:ee.FeatureCollection, bounder:ee.Geometry):
     #     return centers.filterBounds(bounder)
         
-    def _extract_patches_gee(self,source_image: ee.Image, center_points: ee.FeatureCollection, patch_size: int) -> ee.ImageCollection:
+    def _extract_patches_gee(self,source_image: ee.Image, center_points: ee.FeatureCollection, patch_size: int, scale_meters=None) -> ee.ImageCollection:
         """
         Extracts patches from a raster image based on a collection of center points.
 
@@ -493,14 +801,17 @@ class GEEWorkflow:
             raster (ee.Image): original raster image from which patches will be extracted.
             center_points (ee.FeatureCollection): collection of points representing the center of each patch.
             patch_size_pixels (int): size of the square patch to be extracted (in pixels).
+            scale_meters (float): pixel size of source_image in meters, if already known
+                (otherwise taken from its projection's nominalScale() on every call).
 
         Returns:
             ee.ImageCollection: A collection of images, each representing a patch extracted from the raster image.
         """
         
         # Obtain the projection information of the image to calculate the pixel size (meters per pixel)
-        projection = source_image.projection()
-        scale_meters = projection.nominalScale() # nominalScale() 
+        if scale_meters is None:
+            projection = source_image.projection()
+            scale_meters = projection.nominalScale() # nominalScale() 
         
         # change patch size from pixels to meters
         patch_size_meters = ee.Number(patch_size).multiply(scale_meters)
@@ -527,31 +838,24 @@ class GEEWorkflow:
         qa = image.select('QA_PIXEL')
         mask = qa.bitwiseAnd(cloud_shadow_bit_mask).eq(0).And(qa.bitwiseAnd(clouds_bit_mask).eq(0))
         
-        optical_bands = image.select('SR_B[2-7]').multiply(0.0000275).add(-0.2)
-        thermal_band = image.select('ST_B10').multiply(0.00341802).add(149.0)
+        # only the bands used downstream (PATCH_BANDS 'opt' / 'the') are scaled and kept
+        optical_bands = image.select(PATCH_BANDS['opt']).multiply(0.0000275).add(-0.2)
+        thermal_band = image.select(PATCH_BANDS['the']).multiply(0.00341802).add(149.0)
         
-        return image.addBands(optical_bands, None, True).addBands(thermal_band, None, True).updateMask(mask)
+        return ee.Image.cat([optical_bands, thermal_band]).updateMask(mask).copyProperties(image, ['system:time_start'])
 
     def _get_dem(self,source_img,clip_geometry) -> ee.Image:
         return source_img.select('elevation').clip(clip_geometry)
 
-    def _get_landsat_images(self, filter_geometry, start_date, end_date):
-        landsat_col = ee.ImageCollection('LANDSAT/LC09/C02/T1_L2') \
-            .merge(ee.ImageCollection('LANDSAT/LC08/C02/T1_L2')) \
-            .filterBounds(filter_geometry) \
-            .filterDate(start_date, end_date) \
-            .map(self._mask_l8sr_clouds)
+    def _get_landsat_images(self, filter_geometry):
+        landsat_col = self._landsat_base.filterBounds(filter_geometry)
         
         landsat_optical_median = landsat_col.select(['SR_B4', 'SR_B3', 'SR_B2']).median()
         landsat_thermal_median = landsat_col.select('ST_B10').median()
         return {'optical': landsat_optical_median, 'thermal': landsat_thermal_median}
 
-    def _get_sar_image(self, filter_geometry, start_date, end_date):
-        sentinel1_col = ee.ImageCollection('COPERNICUS/S1_GRD') \
-            .filterBounds(filter_geometry) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.listContains('transmitterReceiverPolarisation', 'VV')) \
-            .filter(ee.Filter.eq('instrumentMode', 'IW')).select('VV')
+    def _get_sar_image(self, filter_geometry):
+        sentinel1_col = self._sar_base.filterBounds(filter_geometry)
         return sentinel1_col.median()
 
 